@@ -1,7 +1,12 @@
 from django.contrib import admin
 from django.contrib.admin import StackedInline
 
-from apps.models import Category, Product, ProductImage, Seller
+from django.core.exceptions import ValidationError
+from django.forms import ModelForm
+
+from apps.checkout import change_order_status, can_change_status
+from apps.ledger import apply
+from apps.models import Category, Product, ProductImage, Seller, BalanceTransaction, Order
 from apps.models.shops import ManufactureCategory, Manufacturer
 
 
@@ -32,4 +37,54 @@ class ManufacturerModelAdmin(admin.ModelAdmin):
 
 @admin.register(Seller)
 class SellerModelAdmin(admin.ModelAdmin):
-    list_display = ['id', 'name']
\ No newline at end of file
+    list_display = ['id', 'name']
+
+
+@admin.register(BalanceTransaction)
+class BalanceTransactionModelAdmin(admin.ModelAdmin):
+    """Entries are append-only, a new one (e.g. an adjustment) is applied to the balance right away."""
+    list_display = ['id', 'user', 'amount', 'type', 'order', 'created_at', 'settled_at']
+    list_filter = ['type']
+    fields = ['user', 'amount', 'type', 'order']
+    raw_id_fields = ['user', 'order']
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        entry = apply(obj.user_id, obj.amount, obj.type, order=obj.order)
+        obj.pk, obj.created_at, obj.settled_at = entry.pk, entry.created_at, entry.settled_at
+
+
+class OrderStatusForm(ModelForm):
+    class Meta:
+        model = Order
+        fields = ['status']
+
+    def clean_status(self):
+        status = self.cleaned_data['status']
+        if status != self.instance.status and not can_change_status(self.instance.status, status):
+            raise ValidationError(f"An order can't go from {self.instance.status} to {status}")
+        return status
+
+
+@admin.register(Order)
+class OrderModelAdmin(admin.ModelAdmin):
+    """Only the status is edited here, through change_order_status, which credits or refunds the sellers."""
+    form = OrderStatusForm
+    list_display = ['id', 'user', 'status', 'payment_type', 'total_price', 'created_at']
+    list_filter = ['status']
+    readonly_fields = ['user', 'payment_type', 'promo_code', 'total_price', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        if 'status' in form.changed_data:
+            change_order_status(obj.pk, obj.status)
@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Sum, Count, Max
+from django.db.models.functions import TruncDate
+from django.utils.timezone import now
+
+from apps.models import OrderItem, SellerDailySales, ProductDailySales, CategoryDailySales, RollupWatermark
+
+SALES_WATERMARK = 'sales'
+# orders per batch, each batch is one transaction
+ROLLUP_BATCH_SIZE = 5_000
+# items younger than this may still belong to an uncommitted checkout with a lower order id
+ROLLUP_LAG = timedelta(minutes=1)
+
+# rollup model -> extra dimensions next to (seller, date)
+ROLLUPS = (
+    (SellerDailySales, {}),
+    (ProductDailySales, {'product_id': F('product_id')}),
+    (CategoryDailySales, {'category_id': F('product__category_id')}),
+)
+
+
+def rollup_batch(model, dimensions, items):
+    """Add the sales of `items` to `model` with one INSERT ... SELECT ... ON CONFLICT DO UPDATE."""
+    extra = {name: expr for name, expr in dimensions.items() if name != getattr(expr, 'name', None)}
+    batch = (items.annotate(day=TruncDate('created_at'), **extra)
+             .values('seller_id', 'day', *dimensions)
+             .annotate(batch_revenue=Sum(F('price') * F('quantity')), batch_quantity=Sum('quantity'),
+                       batch_orders=Count('order_id', distinct=True))
+             .order_by())
+    sql, params = batch.query.sql_with_params()
+
+    table = model._meta.db_table
+    keys = ', '.join(['seller_id', 'date', *dimensions])
+    dims = ''.join(f', {name}' for name in dimensions)
+    rollup_sql = f"""
+        INSERT INTO {table} ({keys}, revenue, quantity, order_count)
+        SELECT seller_id, day{dims}, batch_revenue, batch_quantity, batch_orders FROM ({sql}) AS batch
+        ON CONFLICT ({keys}) DO UPDATE SET
+            revenue = {table}.revenue + EXCLUDED.revenue,
+            quantity = {table}.quantity + EXCLUDED.quantity,
+            order_count = {table}.order_count + EXCLUDED.order_count
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(rollup_sql, params)
+
+
+def update_sales_rollups(batch_size=ROLLUP_BATCH_SIZE, lag=ROLLUP_LAG):
+    """
+    Fold order items placed since the watermark into the daily rollups.
+
+    The watermark is an order id: checkout writes all items of an order in
+    one transaction, so an order is never split between two runs. Each batch
+    moves the watermark in the same transaction as the rollup rows, a crash
+    never counts a sale twice. Returns how far the watermark moved.
+    """
+    watermark, _ = RollupWatermark.objects.get_or_create(name=SALES_WATERMARK)
+    upper = (OrderItem.objects.filter(order_id__gt=watermark.last_id, created_at__lt=now() - lag)
+             .aggregate(upper=Max('order_id'))['upper'])
+    if upper is None:
+        return 0
+
+    covered = 0
+    while True:
+        with transaction.atomic():
+            # concurrent runs queue here, each re-reads the watermark once it holds the lock
+            watermark = RollupWatermark.objects.select_for_update().get(name=SALES_WATERMARK)
+            if watermark.last_id >= upper:
+                return covered
+
+            last_id = min(watermark.last_id + batch_size, upper)
+            items = OrderItem.objects.filter(order_id__gt=watermark.last_id, order_id__lte=last_id,
+                                             seller__isnull=False)
+            for model, dimensions in ROLLUPS:
+                rollup_batch(model, dimensions, items)
+
+            covered += last_id - watermark.last_id
+            watermark.last_id = last_id
+            watermark.save(update_fields=['last_id', 'updated_at'])
+
+
+def reset_sales_rollups():
+    with transaction.atomic():
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=SALES_WATERMARK)
+        for model, _ in ROLLUPS:
+            model.objects.all().delete()
+        watermark.last_id = 0
+        watermark.save(update_fields=['last_id', 'updated_at'])
@@ -5,3 +5,6 @@ class AppsConfig(AppConfig):
     name = 'apps'
     default_auto_field = 'django.db.models.BigAutoField'
 
+    def ready(self):
+        import apps.signals  # noqa: F401
+
@@ -0,0 +1,60 @@
+from inspect import isawaitable
+
+from asgiref.sync import sync_to_async
+from rest_framework import exceptions
+
+
+class AsyncAPIViewMixin:
+    """
+    Serves a DRF view natively under ASGI.
+
+    Handlers are coroutines. Authenticators that provide `aauthenticate`
+    are awaited, other authenticators run in a thread. Everything after
+    authentication (permissions, throttles, rendering) is DRF's usual
+    synchronous code, which does not block on I/O for these read views.
+    Under WSGI Django runs the same view in its own event loop.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.aperform_authentication(request)
+            self.initial(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if isawaitable(response):  # DRF's own OPTIONS handler stays synchronous
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def aperform_authentication(self, request):
+        """Resolve `request.user` the way `Request._authenticate` does, without blocking the event loop."""
+        for authenticator in request.authenticators:
+            try:
+                if hasattr(authenticator, 'aauthenticate'):
+                    user_auth_tuple = await authenticator.aauthenticate(request)
+                else:
+                    user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+
+        request._not_authenticated()
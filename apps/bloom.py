@@ -0,0 +1,78 @@
+import math
+from functools import lru_cache
+from hashlib import blake2b
+
+from apps.utils import get_redis
+
+
+# KEYS[1] bitmap; ARGV the bit offsets. Only sets them on a built filter, a missing key means "not built".
+ADD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+for i = 1, #ARGV do
+    redis.call('SETBIT', KEYS[1], ARGV[i], 1)
+end
+return 1
+"""
+
+
+@lru_cache(maxsize=None)
+def add_script():
+    return get_redis().register_script(ADD_SCRIPT)
+
+
+class RedisBloomFilter:
+    """
+    Bloom filter stored as a Redis bitmap (SETBIT/GETBIT), so it works on a
+    plain Redis without the RedisBloom module.
+
+    `might_contain()` never gives a false negative. Until the filter has been
+    built it answers True for everything, so callers fall back to the DB.
+    """
+
+    def __init__(self, key, capacity, error_rate=0.001):
+        self.key = key
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+
+    def offsets(self, value):
+        digest = blake2b(str(value).encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        """Set the bits of `value`; a no-op until the filter is built, or that bitmap would hold just this value."""
+        add_script()(keys=[self.key], args=self.offsets(value))
+
+    def might_contain(self, value):
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.exists(self.key)
+        for offset in self.offsets(value):
+            pipe.getbit(self.key, offset)
+        is_built, *bits = pipe.execute()
+        return not is_built or all(bits)
+
+    def rebuild(self, values, chunk_size=10_000):
+        """Fill a temporary bitmap and swap it in atomically with RENAME."""
+        redis = get_redis()
+        tmp_key = f'{self.key}:rebuilding'
+        redis.delete(tmp_key)
+        # allocate the whole bitmap up front so an empty source still produces a built filter
+        redis.setbit(tmp_key, self.size - 1, 0)
+
+        count = 0
+        pipe = redis.pipeline(transaction=False)
+        for count, value in enumerate(values, start=1):
+            for offset in self.offsets(value):
+                pipe.setbit(tmp_key, offset, 1)
+            if count % chunk_size == 0:
+                pipe.execute()
+        pipe.execute()
+        redis.rename(tmp_key, self.key)
+        return count
+
+
+PHONE_FILTER_CAPACITY = 2_000_000
+
+phone_filter = RedisBloomFilter('bloom:user-phones', PHONE_FILTER_CAPACITY)
@@ -0,0 +1,170 @@
+import json
+from collections import defaultdict
+from hashlib import sha1
+from time import monotonic
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from apps.models import Category, Region, District, User
+
+
+CATEGORY_TREE_KEY = 'category:tree'
+CATEGORY_TREE_VERSION_KEY = 'category:tree:version'
+CATEGORY_TREE_TIMEOUT = 60 * 60 * 24
+
+
+def build_category_tree():
+    from apps.serializers import CategoryTreeModelSerializer
+
+    # one query ordered by (tree_id, lft); children are attached in memory
+    roots = Category.objects.all().get_cached_trees()
+    return list(CategoryTreeModelSerializer(roots, many=True).data)
+
+
+def get_category_tree():
+    cached = cache.get(CATEGORY_TREE_KEY)
+    if cached is not None:
+        return cached['tree']
+
+    version = cache.get_or_set(CATEGORY_TREE_VERSION_KEY, 1, None)
+    tree = build_category_tree()
+    # a category changed while we were building, leave the slot empty for the next reader
+    if cache.get(CATEGORY_TREE_VERSION_KEY) == version:
+        cache.set(CATEGORY_TREE_KEY, {'version': version, 'tree': tree}, CATEGORY_TREE_TIMEOUT)
+    return tree
+
+
+async def aget_category_tree():
+    cached = await cache.aget(CATEGORY_TREE_KEY)
+    if cached is not None:
+        return cached['tree']
+    return await sync_to_async(get_category_tree)()
+
+
+def invalidate_category_tree():
+    try:
+        cache.incr(CATEGORY_TREE_VERSION_KEY)
+    except ValueError:
+        cache.set(CATEGORY_TREE_VERSION_KEY, 1, None)
+    cache.delete(CATEGORY_TREE_KEY)
+
+
+def make_etag(data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return f'"{sha1(payload.encode()).hexdigest()}"'
+
+
+class ReferenceDataCache:
+    """
+    Per-process copy of the regions and districts tables.
+
+    The tables only change through `loaddata`, so each worker loads them once
+    and afterwards only compares its version with the shared one in Redis,
+    at most every `check_interval` seconds. `reload()` bumps that version.
+    """
+    version_key = 'reference-data:version'
+    check_interval = 60
+
+    def __init__(self):
+        self._version = None
+        self._checked_at = 0.0
+        self._snapshot = None
+
+    async def aregions(self):
+        return (await self._aget())['regions']
+
+    async def adistricts(self, region_id=None):
+        return self._districts(await self._aget(), region_id)
+
+    @staticmethod
+    def _districts(snapshot, region_id):
+        if region_id is None:
+            return snapshot['districts']
+        return snapshot['districts_by_region'].get(region_id, snapshot['empty'])
+
+    def reload(self):
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.set(self.version_key, 1, None)
+        self._checked_at = 0.0
+
+    async def _aget(self):
+        # no lock here: two coroutines refreshing at once only load the same snapshot twice
+        if monotonic() - self._checked_at >= self.check_interval:
+            version = await cache.aget_or_set(self.version_key, 1, None)
+            if version != self._version or self._snapshot is None:
+                self._snapshot = await sync_to_async(self._load)()
+                self._version = version
+            self._checked_at = monotonic()
+        return self._snapshot
+
+    @staticmethod
+    def _load():
+        from apps.serializers import RegionModelSerializer, DistrictModelSerializer
+
+        regions = RegionModelSerializer(Region.objects.order_by('id'), many=True).data
+        districts = list(District.objects.order_by('id'))
+        districts_data = DistrictModelSerializer(districts, many=True).data
+
+        by_region = defaultdict(list)
+        for district, data in zip(districts, districts_data):
+            by_region[district.region_id].append(data)
+
+        return {
+            'regions': (regions, make_etag(regions)),
+            'districts': (districts_data, make_etag(districts_data)),
+            'districts_by_region': {pk: (data, make_etag(data)) for pk, data in by_region.items()},
+            'empty': ([], make_etag([])),
+        }
+
+
+reference_data = ReferenceDataCache()
+
+
+PRODUCT_FACETS_TIMEOUT = 60 * 5
+
+
+async def aget_product_facets(queryset, cache_key=None):
+    from apps.filters import product_facets
+
+    facets = None if cache_key is None else await cache.aget(cache_key)
+    if facets is None:
+        facets = await sync_to_async(product_facets)(queryset)
+        if cache_key is not None:
+            await cache.aset(cache_key, facets, PRODUCT_FACETS_TIMEOUT)
+    return facets
+
+
+USER_CACHE_TIMEOUT = 60 * 5
+
+
+def user_cache_key(user_id):
+    return f'user:{user_id}'
+
+
+def get_cached_user(user_id):
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.filter(**{jwt_settings.USER_ID_FIELD: user_id}).first()
+        if user is not None:
+            cache.set(key, user, USER_CACHE_TIMEOUT)
+    return user
+
+
+async def aget_cached_user(user_id):
+    key = user_cache_key(user_id)
+    user = await cache.aget(key)
+    if user is None:
+        user = await User.objects.filter(**{jwt_settings.USER_ID_FIELD: user_id}).afirst()
+        if user is not None:
+            await cache.aset(key, user, USER_CACHE_TIMEOUT)
+    return user
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
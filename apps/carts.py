@@ -0,0 +1,210 @@
+from functools import lru_cache, reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+
+from apps.models import Cart, CartItem, Product
+from apps.utils import get_redis, logger
+
+# every cart hash carries this field once it mirrors Postgres, a hash without it is a cache miss
+LOADED_FIELD = '_'
+
+# KEYS[1] cart hash, KEYS[2] dirty set; ARGV[1] ttl, ARGV[2] user id, ARGV[3] '1' to add the quantities,
+# '0' to set them, then product id / quantity pairs. Returns the new quantities in the same order,
+# or false if the cart isn't loaded.
+UPDATE_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], '_') == 0 then
+    return false
+end
+local result = {}
+for i = 4, #ARGV, 2 do
+    local quantity = tonumber(ARGV[i + 1])
+    if ARGV[3] == '1' then
+        quantity = redis.call('HINCRBY', KEYS[1], ARGV[i], quantity)
+    elseif quantity > 0 then
+        redis.call('HSET', KEYS[1], ARGV[i], quantity)
+    end
+    if quantity <= 0 then
+        quantity = 0
+        redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+    table.insert(result, quantity)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('SADD', KEYS[2], ARGV[2])
+return result
+"""
+
+# KEYS[1] cart hash; ARGV[1] ttl, then product id / quantity pairs. Never overwrites a loaded cart.
+LOAD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], '_', 1, unpack(ARGV, 2))
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+"""
+
+# KEYS[1] cart hash; ARGV product id / quantity pairs as flushed. Drops the products still at those quantities,
+# and the whole hash once nothing newer is left in it.
+DISCARD_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[i + 1] then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+if redis.call('HLEN', KEYS[1]) <= 1 then
+    redis.call('DEL', KEYS[1])
+end
+"""
+
+
+@lru_cache(maxsize=None)
+def update_script():
+    return get_redis().register_script(UPDATE_SCRIPT)
+
+
+@lru_cache(maxsize=None)
+def load_script():
+    return get_redis().register_script(LOAD_SCRIPT)
+
+
+@lru_cache(maxsize=None)
+def discard_script():
+    return get_redis().register_script(DISCARD_SCRIPT)
+
+
+class RedisCartStore:
+    """
+    Write-behind cart storage: quantities live in one Redis hash per user.
+
+    Writes only touch Redis and mark the cart dirty; `flush` copies dirty
+    carts to Cart/CartItem in batches. A cart missing from Redis is loaded
+    from Postgres on first use.
+    """
+    key_format = 'cart:%s'
+    dirty_key = 'cart:dirty'
+    timeout = 60 * 60 * 24 * 7
+
+    def key(self, user_id):
+        return self.key_format % user_id
+
+    def load(self, user_id):
+        with transaction.atomic():
+            # waits out a checkout holding the cart row, reading before its commit would bring the bought items back
+            cart_ids = list(Cart.objects.select_for_update().filter(user_id=user_id).values_list('pk', flat=True))
+            items = CartItem.objects.filter(cart_id__in=cart_ids).values_list('product_id', 'quantity')
+            pairs = [value for item in items for value in item]
+        load_script()(keys=[self.key(user_id)], args=[self.timeout, *pairs])
+
+    def update_many(self, user_id, quantities, increment=False):
+        """
+        Add (`increment`) or set `{product_id: quantity}` in one atomic call,
+        returns the new `{product_id: quantity}` of the products given.
+        """
+        pairs = [value for item in quantities.items() for value in item]
+        args = [self.timeout, user_id, int(increment), *pairs]
+        result = update_script()(keys=[self.key(user_id), self.dirty_key], args=args)
+        if result is None:
+            self.load(user_id)
+            result = update_script()(keys=[self.key(user_id), self.dirty_key], args=args)
+        return dict(zip(quantities, result))
+
+    def add(self, user_id, product_id, quantity=1):
+        """Add `quantity` (may be negative) of a product, returns the new quantity."""
+        return self.update_many(user_id, {product_id: quantity}, increment=True)[product_id]
+
+    def set(self, user_id, product_id, quantity):
+        return self.update_many(user_id, {product_id: quantity})[product_id]
+
+    def remove(self, user_id, product_id):
+        return self.set(user_id, product_id, 0)
+
+    def items(self, user_id):
+        """`{product_id: quantity}` of the user's cart."""
+        raw = get_redis().hgetall(self.key(user_id))
+        if not raw:
+            self.load(user_id)
+            raw = get_redis().hgetall(self.key(user_id))
+        return {int(field): int(value) for field, value in raw.items() if field != LOADED_FIELD.encode()}
+
+    def discard(self, user_id, quantities=None):
+        """
+        Drop the cached cart; the next access reloads it from Postgres.
+
+        Given the `{product_id: quantity}` a flush wrote, only those are
+        dropped: a write that came in after the flush stays in the hash
+        (and in the dirty set) instead of being lost.
+        """
+        if quantities is None:
+            get_redis().delete(self.key(user_id))
+            return
+        pairs = [value for item in quantities.items() for value in item]
+        discard_script()(keys=[self.key(user_id)], args=pairs)
+
+    def flush(self, user_ids):
+        """
+        Copy the carts of `user_ids` to Postgres in one transaction,
+        returns the `{user_id: {product_id: quantity}}` written.
+
+        The cart rows are locked before the hashes are read, so of two
+        overlapping flushes the later one always writes the newer state.
+        """
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return {}
+        with transaction.atomic():
+            Cart.objects.bulk_create([Cart(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+            carts = dict(Cart.objects.select_for_update().filter(user_id__in=user_ids).order_by('user_id')
+                         .values_list('user_id', 'id'))
+
+            pipe = get_redis().pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.hgetall(self.key(user_id))
+            snapshots = dict(zip(user_ids, pipe.execute()))
+
+            quantities = {user_id: {int(field): int(value) for field, value in raw.items()
+                                    if field != LOADED_FIELD.encode()}
+                          for user_id, raw in snapshots.items() if raw}
+            # an expired hash has nothing newer than Postgres, leave that cart alone
+            if not quantities:
+                return quantities
+            # products deleted since they were added would fail the foreign key
+            existing = set(Product.objects.filter(pk__in={pk for items in quantities.values() for pk in items})
+                           .values_list('pk', flat=True))
+
+            removed = [Q(cart_id=carts[user_id]) & ~Q(product_id__in=items) for user_id, items in quantities.items()]
+            CartItem.objects.filter(reduce(or_, removed)).delete()
+            CartItem.objects.upsert([
+                CartItem(cart_id=carts[user_id], product_id=product_id, quantity=quantity)
+                for user_id, items in quantities.items()
+                for product_id, quantity in items.items() if product_id in existing
+            ])
+        return quantities
+
+    def flush_dirty(self, batch_size=500):
+        """Flush every cart changed since the last run; returns the number of carts written."""
+        redis = get_redis()
+        flushed = 0
+        while user_ids := redis.spop(self.dirty_key, batch_size):
+            user_ids = [int(user_id) for user_id in user_ids]
+            try:
+                self.flush(user_ids)
+            except Exception:
+                redis.sadd(self.dirty_key, *user_ids)
+                logger.exception(f"{len(user_ids)} carts could not be flushed")
+                raise
+            flushed += len(user_ids)
+        return flushed
+
+
+cart_store = RedisCartStore()
+
+
+def cart_items(user_id, quantities):
+    """Unsaved CartItems for `{product_id: quantity}`, carrying the annotations the serializer renders."""
+    items = []
+    for product in Product.objects.filter(pk__in=quantities).for_cart(user_id).order_by('id'):
+        item = CartItem(product=product, quantity=quantities[product.pk])
+        item.is_favorite, item.first_image = product.is_favorite, product.first_image
+        items.append(item)
+    return items
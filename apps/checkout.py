@@ -0,0 +1,119 @@
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from apps import ledger
+from apps.carts import cart_store
+from apps.models import Cart, CartItem, Order, OrderItem, PromoCode, BalanceTransaction
+
+
+def discounted_price(price, discount):
+    # rows saved before the 100% cap may still hold more; never sell below zero
+    return price * (100 - min(discount, 100)) // 100
+
+
+def redeem_promo_code(code):
+    """Spend one use of `code` with a single conditional UPDATE, the row is never locked."""
+    promo = PromoCode.objects.filter(code=code).first()
+    if promo is None:
+        raise ValidationError({'promo_code': "Promo code not found"})
+
+    redeemed = (PromoCode.objects
+                .filter(pk=promo.pk, is_active=True)
+                .filter(Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()))
+                .filter(Q(usage_limit__isnull=True) | Q(used_count__lt=F('usage_limit')))
+                .update(used_count=F('used_count') + 1))
+    if not redeemed:
+        raise ValidationError({'promo_code': "Promo code is expired or used up"})
+    return promo
+
+
+@transaction.atomic
+def place_order(user, promo_code=None, **order_fields):
+    """
+    Turn the user's cart into an order.
+
+    Only the user's Cart row is locked, so concurrent checkouts of the same
+    products never wait on each other. Prices are snapshotted with the
+    product discount applied; the query count does not depend on the
+    number of cart items.
+    """
+    # the cart store writes behind, bring Postgres up to date before reading the items
+    flushed = cart_store.flush([user.pk]).get(user.pk, {})
+    cart = Cart.objects.select_for_update(of=('self',)).filter(user=user).first()
+    items = [] if cart is None else list(
+        CartItem.objects.filter(cart=cart).order_by('id')
+        .values_list('product_id', 'product__seller_id', 'quantity', 'product__price', 'product__discount'))
+    if not items:
+        raise ValidationError("Cart is empty")
+
+    order_items = [OrderItem(product_id=product_id, seller_id=seller_id, quantity=quantity,
+                             price=discounted_price(price, discount))
+                   for product_id, seller_id, quantity, price, discount in items]
+    total_price = sum(item.price * item.quantity for item in order_items)
+
+    promo = None
+    if promo_code:
+        promo = redeem_promo_code(promo_code)
+        total_price = discounted_price(total_price, promo.discount)
+
+    order = Order.objects.create(user=user, promo_code=promo, total_price=total_price, **order_fields)
+    for item in order_items:
+        item.order = order
+        item.ordered_at = order.created_at
+    OrderItem.objects.bulk_create(order_items)
+    CartItem.objects.filter(cart=cart).delete()
+    # dropped while the cart row is locked: a flush waiting on the lock then finds no hash to write back,
+    # and a reload waits for the commit; on rollback the hash reloads from the rows flushed above.
+    # Only the flushed quantities go, a product added since the flush stays in the cart.
+    cart_store.discard(user.pk, flushed)
+    return order
+
+
+def seller_credits(order):
+    """
+    `{owner_id: amount}` the order's sellers earn.
+
+    A promo code discounts the whole order, so every seller's share is cut in
+    the same proportion; rounding down keeps the sum within total_price.
+    """
+    sales = dict(OrderItem.objects.filter(order=order).values('seller__owner_id')
+                 .annotate(amount=Sum(F('price') * F('quantity'))).order_by()
+                 .values_list('seller__owner_id', 'amount'))
+    gross = sum(sales.values())
+    return {owner_id: amount * order.total_price // gross
+            for owner_id, amount in sales.items() if owner_id is not None and gross}
+
+
+@transaction.atomic
+def change_order_status(order_id, status):
+    """
+    Move an order to `status` under a row lock.
+
+    Sellers are credited once the order is delivered, so an unpaid order
+    never reaches their balances; cancelling a delivered order posts the
+    refunds that take it back. A cancelled order is final.
+    """
+    order = Order.objects.select_for_update().get(pk=order_id)
+    previous = order.status
+    if previous == status:
+        return order
+    if not can_change_status(previous, status):
+        raise ValidationError({'status': f"An order can't go from {previous} to {status}"})
+
+    order.status = status
+    order.save(update_fields=['status', 'updated_at'])
+    if status == Order.Status.DELIVERED:
+        ledger.record_many(seller_credits(order), BalanceTransaction.Type.SALE, order=order)
+    elif previous == Order.Status.DELIVERED:
+        refunds = {owner_id: -amount for owner_id, amount in seller_credits(order).items()}
+        ledger.record_many(refunds, BalanceTransaction.Type.REFUND, order=order)
+    return order
+
+
+def can_change_status(previous, status):
+    # a delivered order can only be cancelled (a return), a cancelled one never changes again
+    if previous == Order.Status.CANCELLED:
+        return False
+    return previous != Order.Status.DELIVERED or status == Order.Status.CANCELLED
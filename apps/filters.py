@@ -1,3 +1,19 @@
+import re
+from datetime import datetime, time, timedelta
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import F, FloatField, IntegerChoices
+from django.db.models.functions import Cast
+from django.utils.timezone import now, make_aware
+from django_filters import FilterSet, NumberFilter, BooleanFilter, BaseInFilter, ChoiceFilter, DateFilter, \
+    MultipleChoiceFilter
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from apps.models import Category, Product, Order, OrderItem
+
 # from datetime import timedelta
 #
 # from django.db.models import Q, Exists, OuterRef
@@ -69,4 +85,167 @@
 #         return queryset.annotate(image_count=Count('images')).filter(image_count=value)
 #
 #     def category_length_filter(self, queryset, name, value):
-#         return queryset.annotate(category_length=Length('category__name')).filter(category_length=value)
\ No newline at end of file
+#         return queryset.annotate(category_length=Length('category__name')).filter(category_length=value)
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    Ranked full-text search over the GIN-indexed `search_vector` column.
+
+    The last term is matched as a prefix (`lapt` finds `laptop`) for type-ahead.
+    Results are ordered by rank unless the client asks for another ordering.
+    """
+    search_param = api_settings.SEARCH_PARAM
+    search_config = 'simple'
+    search_title = 'Search'
+    search_description = 'A search term.'
+
+    def get_search_query(self, request):
+        terms = re.findall(r'\w+', request.query_params.get(self.search_param, ''))
+        if not terms:
+            return None
+        terms[-1] += ':*'
+        return SearchQuery(' & '.join(terms), config=self.search_config, search_type='raw')
+
+    def filter_queryset(self, request, queryset, view):
+        query = self.get_search_query(request)
+        if query is None:
+            return queryset
+
+        # double precision so the rank survives a round-trip through a keyset cursor
+        rank = Cast(SearchRank(F('search_vector'), query), FloatField())
+        return queryset.filter(search_vector=query).annotate(search_rank=rank).order_by('-search_rank', 'id')
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.search_param,
+                'required': False,
+                'in': 'query',
+                'description': self.search_description,
+                'schema': {'type': 'string'},
+            },
+        ]
+
+
+class NumberInFilter(BaseInFilter, NumberFilter):
+    pass
+
+
+class ProductFilterSet(FilterSet):
+    min_price = NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = NumberFilter(field_name='price', lookup_expr='lte')
+    min_discount = NumberFilter(field_name='discount', lookup_expr='gte')
+    has_discount = BooleanFilter(method='has_discount_filter')
+    seller = NumberInFilter(field_name='seller_id', help_text='Comma separated seller ids')
+    category = NumberFilter(method='category_subtree_filter', help_text='Category id, includes all subcategories')
+
+    class Meta:
+        model = Product
+        fields = ['category_id']
+
+    def has_discount_filter(self, queryset, name, value):
+        return queryset.filter(discount__gt=0) if value else queryset.filter(discount=0)
+
+    def category_subtree_filter(self, queryset, name, value):
+        category = Category.objects.filter(pk=value).only('tree_id', 'lft', 'rght', 'level').first()
+        if category is None:
+            return queryset.none()
+        return queryset.filter(category__in=category.get_descendants(include_self=True))
+
+
+class OrderFilterSet(FilterSet):
+    """
+    Every filter compares the bare `created_at` column with a datetime
+    bound, so the (user, created_at) indexes stay usable.
+    """
+    created_field = 'created_at'
+    status_field = 'status'
+
+    class PeriodChoice(IntegerChoices):
+        ONE_DAY = 1, '1 Kun'
+        THREE_DAY = 3, '3 Kun'
+        ONE_WEEK = 7, '1 Hafta'
+        ONE_MONTH = 30, '1 Oy'
+
+    period = ChoiceFilter(choices=PeriodChoice.choices, method='period_filter')
+    date_from = DateFilter(method='date_from_filter')
+    date_to = DateFilter(method='date_to_filter', help_text='Inclusive')
+    status = MultipleChoiceFilter(choices=Order.Status.choices, method='status_filter')
+
+    class Meta:
+        model = Order
+        fields = []
+
+    def period_filter(self, queryset, name, value):
+        return queryset.filter(**{f'{self.created_field}__gte': now() - timedelta(days=int(value))})
+
+    def status_filter(self, queryset, name, value):
+        return queryset.filter(**{f'{self.status_field}__in': value}) if value else queryset
+
+    def date_from_filter(self, queryset, name, value):
+        return queryset.filter(**{f'{self.created_field}__gte': make_aware(datetime.combine(value, time.min))})
+
+    def date_to_filter(self, queryset, name, value):
+        bound = make_aware(datetime.combine(value + timedelta(days=1), time.min))
+        return queryset.filter(**{f'{self.created_field}__lt': bound})
+
+
+class SellerOrderFilterSet(OrderFilterSet):
+    """The order filters over the items of a seller, on the order time copied to them."""
+    created_field = 'ordered_at'
+    status_field = 'order__status'
+
+    class Meta:
+        model = OrderItem
+        fields = []
+
+
+class SalesRollupFilterSet(FilterSet):
+    date_from = DateFilter(field_name='date', lookup_expr='gte', help_text='Defaults to 30 days ago')
+    date_to = DateFilter(field_name='date', lookup_expr='lte')
+    seller = NumberFilter(field_name='seller_id')
+
+
+PRICE_BUCKETS = [0, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000, 50_000_000]
+
+
+def product_facets(queryset):
+    """
+    Category, seller and price-bucket counts of `queryset` in a single
+    `GROUP BY GROUPING SETS` query.
+    """
+    inner = queryset.order_by().prefetch_related(None).values(
+        'category_id', 'seller_id', 'price',
+        category_name=F('category__name'), seller_name=F('seller__name'),
+    )
+    facets = {'categories': [], 'sellers': [], 'prices': []}
+    try:
+        sql, params = inner.query.sql_with_params()
+    except EmptyResultSet:  # e.g. `queryset.none()` for an unknown category
+        return facets
+
+    facets_sql = f"""
+        SELECT GROUPING(category_id, seller_id), category_id, category_name, seller_id, seller_name,
+               price_bucket, COUNT(*)
+        FROM (SELECT *, width_bucket(price, %s) AS price_bucket FROM ({sql}) AS filtered) AS products
+        GROUP BY GROUPING SETS ((category_id, category_name), (seller_id, seller_name), (price_bucket))
+    """
+
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(facets_sql, [PRICE_BUCKETS, *params])
+        rows = cursor.fetchall()
+
+    for grouping, category_id, category_name, seller_id, seller_name, bucket, count in rows:
+        if grouping == 0b01:
+            facets['categories'].append({'id': category_id, 'name': category_name, 'count': count})
+        elif grouping == 0b10:
+            facets['sellers'].append({'id': seller_id, 'name': seller_name, 'count': count})
+        elif bucket:
+            upper = PRICE_BUCKETS[bucket] if bucket < len(PRICE_BUCKETS) else None
+            facets['prices'].append({'min': PRICE_BUCKETS[bucket - 1], 'max': upper, 'count': count})
+
+    facets['categories'].sort(key=lambda item: -item['count'])
+    facets['sellers'].sort(key=lambda item: -item['count'])
+    facets['prices'].sort(key=lambda item: item['min'])
+    return facets
@@ -0,0 +1,186 @@
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from itertools import islice
+from secrets import token_hex
+
+from django.db import transaction
+from django.utils.text import slugify
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import CharField, IntegerField, JSONField
+
+from rest_framework.serializers import Serializer
+
+from apps.models import Product, Category, Seller
+
+
+class ProductImportRowSerializer(Serializer):
+    name = CharField(max_length=255)
+    price = IntegerField(min_value=0)
+    discount = IntegerField(min_value=0, max_value=100, default=0)
+    description = CharField(allow_blank=True, default='')
+    specification = JSONField(required=False)
+    category = IntegerField()
+    seller = IntegerField(required=False)
+
+    def validate_specification(self, value):
+        if not isinstance(value, dict):
+            raise ValidationError('Expected a JSON object')
+        return value
+
+
+@dataclass
+class ImportResult:
+    processed: int = 0
+    created: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+
+
+class ProductImporter:
+    """
+    Streams products from a CSV or JSONL file and writes them with
+    `bulk_create`, one transaction per chunk.
+
+    Rows are validated field by field in memory; categories, sellers and
+    slug collisions are resolved with one query per chunk, so the number of
+    queries grows with the number of chunks, not rows.
+
+    With `owner_id` the import runs on behalf of that user: rows go to the
+    job's seller whatever their `seller` column says, and without a job
+    seller a row may only name a seller the user owns.
+    """
+    chunk_size = 1000
+    max_errors = 1000
+    slug_max_length = 240
+
+    def __init__(self, seller_id=None, owner_id=None, chunk_size=None, on_progress=None):
+        self.seller_id = seller_id
+        self.owner_id = owner_id
+        self.chunk_size = chunk_size or self.chunk_size
+        self.on_progress = on_progress
+        self.result = ImportResult()
+
+    def run(self, file, file_format):
+        rows = enumerate(self.read_rows(file, file_format), start=1)
+        while chunk := list(islice(rows, self.chunk_size)):
+            self.import_chunk(chunk)
+            if self.on_progress is not None:
+                self.on_progress(self.result)
+        return self.result
+
+    @staticmethod
+    def read_rows(file, file_format):
+        text = io.TextIOWrapper(file, encoding='utf-8-sig') if isinstance(file.read(0), bytes) else file
+        if file_format == 'csv':
+            for row in csv.DictReader(text):
+                # empty cells fall back to the field defaults
+                row = {key: value for key, value in row.items() if key is not None and value not in ('', None)}
+                if 'specification' in row:
+                    try:
+                        row['specification'] = json.loads(row['specification'])
+                    except ValueError:
+                        pass
+                yield row
+            return
+
+        for line in text:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+    def import_chunk(self, chunk):
+        valid = []
+        for number, row in chunk:
+            if row is None:
+                self.add_error(number, {'non_field_errors': ['Invalid JSON line']})
+                continue
+
+            serializer = ProductImportRowSerializer(data=row)
+            if not serializer.is_valid():
+                self.add_error(number, serializer.errors)
+            else:
+                data = serializer.validated_data
+                if self.owner_id is not None and self.seller_id is not None:
+                    data['seller'] = self.seller_id
+                else:
+                    data.setdefault('seller', self.seller_id)
+                valid.append((number, data))
+
+        valid = self.check_relations(valid)
+        if valid:
+            slugs = self.allocate_slugs([data['name'] for _, data in valid])
+            products = [
+                Product(
+                    slug=slug,
+                    name=data['name'],
+                    price=data['price'],
+                    discount=data['discount'],
+                    description=data['description'],
+                    specification=data.get('specification') or {},
+                    category_id=data['category'],
+                    seller_id=data['seller'],
+                )
+                for slug, (_, data) in zip(slugs, valid)
+            ]
+            with transaction.atomic():
+                created = Product.objects.bulk_create(products)
+                # bulk_create skips save() and signals
+                Product.objects.filter(id__in=[product.id for product in created]).update_search_vector()
+            self.result.created += len(created)
+
+        self.result.processed += len(chunk)
+
+    def check_relations(self, rows):
+        category_ids = {data['category'] for _, data in rows}
+        seller_ids = {data['seller'] for _, data in rows if data['seller'] is not None}
+        categories = set(Category.objects.filter(id__in=category_ids).values_list('id', flat=True))
+        sellers = Seller.objects.filter(id__in=seller_ids)
+        if self.owner_id is not None:
+            sellers = sellers.filter(owner_id=self.owner_id)
+        sellers = set(sellers.values_list('id', flat=True))
+
+        checked = []
+        for number, data in rows:
+            errors = {}
+            if data['category'] not in categories:
+                errors['category'] = [f"Category {data['category']} does not exist"]
+            if data['seller'] is None:
+                errors['seller'] = ['This field is required.']
+            elif data['seller'] not in sellers:
+                errors['seller'] = [f"Seller {data['seller']} does not exist"
+                                    + (" or is not yours" if self.owner_id is not None else "")]
+
+            if errors:
+                self.add_error(number, errors)
+            else:
+                checked.append((number, data))
+        return checked
+
+    def allocate_slugs(self, names):
+        slugs = [slugify(name)[:self.slug_max_length] or token_hex(4) for name in names]
+        taken = set(Product.objects.filter(slug__in=set(slugs)).values_list('slug', flat=True))
+
+        while True:
+            seen, clashes = set(), []
+            for index, slug in enumerate(slugs):
+                if slug in taken or slug in seen:
+                    clashes.append(index)
+                seen.add(slug)
+            if not clashes:
+                return slugs
+
+            for index in clashes:
+                base = slugify(names[index])[:self.slug_max_length]
+                slugs[index] = f'{base}-{token_hex(3)}'
+            candidates = {slugs[index] for index in clashes}
+            taken |= set(Product.objects.filter(slug__in=candidates).values_list('slug', flat=True))
+
+    def add_error(self, row, errors):
+        self.result.error_count += 1
+        if len(self.result.errors) < self.max_errors:
+            self.result.errors.append({'row': row, 'errors': errors})
@@ -0,0 +1,119 @@
+from django.db import connection, transaction
+from django.db.models import F, Sum, Exists, OuterRef
+from django.utils.timezone import now
+from rest_framework.exceptions import ValidationError
+
+from apps.models import UserBalance, BalanceTransaction
+
+SETTLE_BATCH_SIZE = 1_000
+
+UPSERT_BALANCES_SQL = f"""
+    INSERT INTO {UserBalance._meta.db_table} (user_id, balance)
+    SELECT * FROM unnest(%s::bigint[], %s::bigint[])
+    ON CONFLICT (user_id) DO UPDATE SET balance = {UserBalance._meta.db_table}.balance + EXCLUDED.balance
+"""
+
+
+def add_to_balances(amounts):
+    """Add `{user_id: amount}` to the balances in one statement, creating missing rows."""
+    if not amounts:
+        return
+    user_ids = sorted(amounts)  # a fixed lock order, concurrent batches can't deadlock
+    with connection.cursor() as cursor:
+        cursor.execute(UPSERT_BALANCES_SQL, [user_ids, [amounts[user_id] for user_id in user_ids]])
+
+
+def record(user_id, amount, type, order=None):
+    """
+    Append a ledger entry without touching the balance; `settle` applies it later.
+
+    Meant for high-frequency credits (sales, refunds) that must not wait on
+    the balance row.
+    """
+    return BalanceTransaction.objects.create(user_id=user_id, amount=amount, type=type, order=order)
+
+
+def record_many(amounts, type, order=None):
+    """`record` of `{user_id: amount}` with one INSERT."""
+    return BalanceTransaction.objects.bulk_create([
+        BalanceTransaction(user_id=user_id, amount=amount, type=type, order=order)
+        for user_id, amount in amounts.items()
+    ])
+
+
+@transaction.atomic
+def apply(user_id, amount, type, order=None):
+    """Append a ledger entry and apply it to the balance right away."""
+    entry = BalanceTransaction.objects.create(user_id=user_id, amount=amount, type=type, order=order,
+                                              settled_at=now())
+    add_to_balances({user_id: amount})
+    return entry
+
+
+@transaction.atomic
+def withdraw(user_id, amount, type=BalanceTransaction.Type.PAYOUT):
+    """
+    Debit `amount` if the settled balance covers it.
+
+    The check and the debit are one conditional UPDATE, so concurrent payouts
+    can't overdraw the balance and no row is locked for longer than that statement.
+    """
+    debited = (UserBalance.objects.filter(user_id=user_id, balance__gte=amount)
+               .update(balance=F('balance') - amount))
+    if not debited:
+        raise ValidationError("Insufficient balance")
+    return BalanceTransaction.objects.create(user_id=user_id, amount=-amount, type=type, settled_at=now())
+
+
+def settle(batch_size=SETTLE_BATCH_SIZE):
+    """
+    Apply unsettled entries to the balances in batches, returns the number settled.
+
+    Every batch sums its entries per user, so a burst of sales to one seller
+    costs one balance update. Workers running in parallel skip each other's
+    locked entries instead of waiting.
+    """
+    settled = 0
+    while True:
+        with transaction.atomic():
+            entries = list(BalanceTransaction.objects
+                           .filter(settled_at__isnull=True)
+                           .order_by('id')
+                           .select_for_update(skip_locked=True)
+                           .values_list('id', 'user_id', 'amount')[:batch_size])
+            if not entries:
+                return settled
+
+            amounts = {}
+            for _, user_id, amount in entries:
+                amounts[user_id] = amounts.get(user_id, 0) + amount
+            add_to_balances(amounts)
+            BalanceTransaction.objects.filter(id__in=[entry[0] for entry in entries]).update(settled_at=now())
+        settled += len(entries)
+
+
+def ledger_balances(user_ids=None):
+    """`{user_id: sum of settled entries}`"""
+    qs = BalanceTransaction.objects.filter(settled_at__isnull=False)
+    if user_ids is not None:
+        qs = qs.filter(user_id__in=user_ids)
+    return dict(qs.values('user_id').annotate(total=Sum('amount')).order_by().values_list('user_id', 'total'))
+
+
+def open_accounts(using='default'):
+    """
+    Give every non-zero balance without ledger entries a settled opening
+    adjustment of the whole balance, returns the number opened.
+
+    Balances from before the ledger would otherwise count as drift, and
+    `reconcile_balances --fix` would zero them.
+    """
+    has_entries = BalanceTransaction.objects.using(using).filter(user_id=OuterRef('user_id'))
+    balances = (UserBalance.objects.using(using).exclude(balance=0).exclude(Exists(has_entries))
+                .values_list('user_id', 'balance'))
+    settled_at = now()
+    return len(BalanceTransaction.objects.using(using).bulk_create([
+        BalanceTransaction(user_id=user_id, amount=balance, type=BalanceTransaction.Type.ADJUSTMENT,
+                           settled_at=settled_at)
+        for user_id, balance in balances
+    ], batch_size=SETTLE_BATCH_SIZE))
@@ -0,0 +1,62 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from apps.models import Product
+from apps.paginations import KeysetPagination
+
+
+class Command(BaseCommand):
+    help = 'Compare offset (page number) and keyset pagination latency on the product catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--depths', nargs='+', type=int, default=[0, 1_000, 10_000, 100_000])
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--ordering', nargs='+', default=['id', '-price', '-created_at'],
+                            help='orderings to measure; the keyset tie-breaker is appended as in the API')
+
+    def handle(self, *args, depths, repeat, ordering, **options):
+        for field in ordering:
+            self.stdout.write(f'ordering={field}')
+            self._bench(Product.objects.order_by(field), depths, repeat)
+
+    def _bench(self, queryset, depths, repeat):
+        factory = APIRequestFactory()
+        page_size = KeysetPagination.page_size
+        keyset = KeysetPagination()
+        keyset.ordering = keyset.get_ordering(Request(factory.get('/')), queryset, None)
+        queryset = queryset.order_by(*keyset.ordering)
+
+        self.stdout.write(f"{'rows skipped':>14} {'offset ms':>10} {'keyset ms':>10} {'queries':>8}")
+        for depth in depths:
+            pivot = queryset[depth - 1:depth].first() if depth else None
+            if depth and pivot is None:
+                self.stdout.write(f'{depth:>14} skipped: catalog has fewer rows')
+                continue
+
+            page = depth // page_size + 1
+            offset_request = Request(factory.get('/', {'page': page}))
+            offset_ms, _ = self._measure(repeat, lambda: PageNumberPagination().paginate_queryset(
+                queryset, offset_request))
+
+            params = {'cursor': keyset.make_cursor(pivot)} if pivot else {}
+            keyset_request = Request(factory.get('/', params))
+            keyset_ms, queries = self._measure(repeat, lambda: KeysetPagination().paginate_queryset(
+                queryset, keyset_request))
+
+            self.stdout.write(f'{depth:>14} {offset_ms:>10.2f} {keyset_ms:>10.2f} {queries:>8}')
+
+    @staticmethod
+    def _measure(repeat, func):
+        best = float('inf')
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(repeat):
+                start = perf_counter()
+                func()
+                best = min(best, perf_counter() - start)
+        return best * 1000, len(ctx.captured_queries) // repeat
@@ -0,0 +1,41 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.imports import ProductImporter
+
+
+class Command(BaseCommand):
+    help = 'Stream products from a CSV or JSONL file into the catalog with batched inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path)
+        parser.add_argument('--format', choices=['csv', 'jsonl'], dest='file_format')
+        parser.add_argument('--seller', type=int, help='Seller id for rows without a `seller` column')
+        parser.add_argument('--chunk-size', type=int, default=ProductImporter.chunk_size)
+        parser.add_argument('--errors', type=Path, help='Write per-row errors to this JSONL file')
+
+    def handle(self, *args, path, file_format, seller, chunk_size, errors, **options):
+        if not path.exists():
+            raise CommandError(f'{path} does not exist')
+        file_format = file_format or ('csv' if path.suffix.lower() == '.csv' else 'jsonl')
+
+        def report(result):
+            self.stdout.write(f'{result.processed} rows, {result.created} created, {result.error_count} errors',
+                              ending='\r')
+
+        importer = ProductImporter(seller_id=seller, chunk_size=chunk_size, on_progress=report)
+        importer.max_errors = float('inf') if errors else ProductImporter.max_errors
+        with path.open('rb') as file:
+            result = importer.run(file, file_format)
+
+        if errors:
+            with errors.open('w') as file:
+                file.writelines(json.dumps(error) + '\n' for error in result.errors)
+        elif result.errors:
+            for error in result.errors[:20]:
+                self.stderr.write(f"row {error['row']}: {error['errors']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n{result.processed} rows processed, {result.created} created, {result.error_count} errors'))
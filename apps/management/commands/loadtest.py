@@ -0,0 +1,66 @@
+import asyncio
+from statistics import quantiles
+from time import perf_counter
+
+import httpx
+from django.core.management.base import BaseCommand
+
+HOT_PATHS = [
+    '/api/v1/products/',
+    '/api/v1/categories/tree/',
+    '/api/v1/regions/',
+    '/api/v1/districts/',
+    '/health/',
+]
+
+
+class Command(BaseCommand):
+    help = ('Load test the hot read endpoints of a running server; '
+            'run it against `make run-wsgi` and `make run-asgi` to compare the two')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000')
+        parser.add_argument('--paths', nargs='+', default=HOT_PATHS)
+        parser.add_argument('--concurrency', type=int, default=100, help='Open connections')
+        parser.add_argument('--requests', type=int, default=2_000, help='Requests per path')
+        parser.add_argument('--token', help='Access token, adds /api/v1/users/get-me/ to the paths')
+
+    def handle(self, *args, url, paths, concurrency, requests, token, **options):
+        headers = {}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+            paths = [*paths, '/api/v1/users/get-me/']
+
+        self.stdout.write(f"{'path':<32} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for path in paths:
+            rps, latencies, errors = asyncio.run(self.run(url + path, headers, concurrency, requests))
+            percentiles = quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+            p50, p95, p99 = (percentiles[i] * 1000 for i in (49, 94, 98))
+            self.stdout.write(f'{path:<32} {rps:>8.0f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {errors:>7}')
+
+    @staticmethod
+    async def run(url, headers, concurrency, requests):
+        latencies, errors = [], 0
+        remaining = iter(range(requests))
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+        async with httpx.AsyncClient(headers=headers, limits=limits, timeout=30) as client:
+            async def worker():
+                nonlocal errors
+                for _ in remaining:
+                    start = perf_counter()
+                    try:
+                        response = await client.get(url)
+                        failed = response.status_code >= 400
+                    except httpx.HTTPError:
+                        failed = True
+                    if failed:
+                        errors += 1
+                    else:
+                        latencies.append(perf_counter() - start)
+
+            started = perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = perf_counter() - started
+
+        return requests / elapsed, latencies, errors
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from apps.bloom import phone_filter
+from apps.models import User
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the Bloom filter of registered phones used by the phone-exists check'
+
+    def handle(self, *args, **options):
+        started_at = now() - timedelta(minutes=1)
+        phones = User.objects.values_list('phone', flat=True).iterator(chunk_size=10_000)
+        count = phone_filter.rebuild(phones)
+
+        # users registered while we were building went into the bitmap we just replaced
+        for phone in User.objects.filter(date_joined__gte=started_at).values_list('phone', flat=True):
+            phone_filter.add(phone)
+        self.stdout.write(self.style.SUCCESS(f'{count} phones added to {phone_filter.key}'))
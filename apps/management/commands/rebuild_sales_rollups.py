@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.analytics import reset_sales_rollups, update_sales_rollups, ROLLUP_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily sales rollups from the whole order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=ROLLUP_BATCH_SIZE, help='Orders per transaction')
+
+    def handle(self, *args, batch_size, **options):
+        reset_sales_rollups()
+        covered = update_sales_rollups(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Sales rollups rebuilt, {covered} order ids rolled up'))
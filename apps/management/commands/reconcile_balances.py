@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.ledger import ledger_balances
+from apps.models import UserBalance
+
+
+class Command(BaseCommand):
+    help = 'Compare every UserBalance with the sum of its settled ledger entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Overwrite mismatched balances with the ledger sum')
+
+    def handle(self, *args, fix, **options):
+        expected = ledger_balances()
+        balances = dict(UserBalance.objects.values_list('user_id', 'balance'))
+
+        accounts = expected.keys() | balances.keys()
+        mismatched = [user_id for user_id in accounts if expected.get(user_id, 0) != balances.get(user_id, 0)]
+        for user_id in sorted(mismatched):
+            # the two reads above are not one snapshot, re-check under a row lock before reporting
+            with transaction.atomic():
+                balance = UserBalance.objects.select_for_update().filter(user_id=user_id).first()
+                actual = balance.balance if balance else 0
+                ledger = ledger_balances([user_id]).get(user_id, 0)
+                if actual == ledger:
+                    continue
+
+                self.stdout.write(self.style.WARNING(f'user {user_id}: balance {actual}, ledger {ledger}'))
+                if fix:
+                    UserBalance.objects.update_or_create(user_id=user_id, defaults={'balance': ledger})
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(accounts)} balances checked, {len(mismatched)} needed a second look'))
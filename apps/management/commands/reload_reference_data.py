@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.caches import reference_data
+
+
+class Command(BaseCommand):
+    help = 'Make every worker reload its cached regions and districts (run after loaddata)'
+
+    def handle(self, *args, **options):
+        reference_data.reload()
+        self.stdout.write(self.style.SUCCESS('Reference data version bumped'))
@@ -0,0 +1,23 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db.models import F, OuterRef, Subquery
+
+from apps.models import Order, OrderItem
+from apps.models.base import CreatedBaseModel
+
+
+class Command(BaseCommand):
+    help = 'One-off repair of rows saved before the created_at/updated_at fix and the OrderItem.ordered_at copy'
+
+    def handle(self, *args, **options):
+        # created_at used to be auto_now and updated_at auto_now_add; rows saved back then are the only
+        # ones with updated_at < created_at, so running this twice changes nothing
+        swapped = 0
+        for model in apps.get_app_config('apps').get_models():
+            if issubclass(model, CreatedBaseModel) and not model._meta.proxy:
+                swapped += (model._base_manager.filter(updated_at__lt=F('created_at'))
+                            .update(created_at=F('updated_at'), updated_at=F('created_at')))
+
+        order_time = Order.objects.filter(pk=OuterRef('order_id')).values('created_at')
+        backfilled = OrderItem.objects.filter(ordered_at__isnull=True).update(ordered_at=Subquery(order_time))
+        self.stdout.write(self.style.SUCCESS(f'{swapped} timestamps swapped back, {backfilled} order items dated'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from apps.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Rebuild product search vectors in id-range batches (backfill or after bulk edits)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, batch_size, **options):
+        last_id = Product.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        updated = 0
+        for start in range(0, last_id + 1, batch_size):
+            updated += Product.objects.filter(id__gte=start, id__lt=start + batch_size).update_search_vector()
+            self.stdout.write(f'{updated} products updated', ending='\r')
+        self.stdout.write(self.style.SUCCESS(f'{updated} products updated'))
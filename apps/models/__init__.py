@@ -1,5 +1,7 @@
 from apps.models.addresses import District, Region, Address
+from apps.models.analytics import SellerDailySales, ProductDailySales, CategoryDailySales, RollupWatermark
+from apps.models.imports import ProductImport
 from apps.models.orders import Favorite, Cart, CartItem, Order, OrderItem, PromoCode
 from apps.models.products import Category, Product, ProductImage
 from apps.models.shops import Seller, Manufacturer
-from apps.models.users import User, UserBalance
\ No newline at end of file
+from apps.models.users import User, UserBalance, BalanceTransaction
@@ -0,0 +1,50 @@
+from django.db.models import ForeignKey, CASCADE, Model, UniqueConstraint
+from django.db.models.fields import CharField, DateField, BigIntegerField, PositiveIntegerField, DateTimeField
+
+
+class SalesRollup(Model):
+    date = DateField()
+    revenue = BigIntegerField(db_default=0)
+    quantity = PositiveIntegerField(db_default=0)
+    order_count = PositiveIntegerField(db_default=0)
+
+    class Meta:
+        abstract = True
+
+
+class SellerDailySales(SalesRollup):
+    seller = ForeignKey('apps.Seller', CASCADE, related_name='daily_sales')
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['seller', 'date'], name='seller_daily_sales_unique'),
+        ]
+
+
+class ProductDailySales(SalesRollup):
+    seller = ForeignKey('apps.Seller', CASCADE, related_name='product_daily_sales')
+    product = ForeignKey('apps.Product', CASCADE, related_name='daily_sales')
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['seller', 'date', 'product'], name='product_daily_sales_unique'),
+        ]
+
+
+class CategoryDailySales(SalesRollup):
+    seller = ForeignKey('apps.Seller', CASCADE, related_name='category_daily_sales')
+    category = ForeignKey('apps.Category', CASCADE, related_name='daily_sales')
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['seller', 'date', 'category'], name='category_daily_sales_unique'),
+        ]
+
+
+class RollupWatermark(Model):
+    name = CharField(max_length=100, unique=True)
+    last_id = BigIntegerField(default=0)
+    updated_at = DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name}: {self.last_id}'
@@ -1,14 +1,14 @@
-
+import os
 from datetime import datetime
 from io import BytesIO
 
 from PIL import Image
 from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
-from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
 from django.core.validators import FileExtensionValidator
-from django.db.models import Model, ImageField
-from django.db.models.fields import SlugField, DateTimeField
+from django.db import transaction
+from django.db.models import Model, ImageField, TextChoices
+from django.db.models.fields import SlugField, DateTimeField, CharField
 from django.db.models.fields.files import ImageFieldFile
 from django.utils.text import slugify
 
@@ -32,34 +32,39 @@ class SlugBaseModel(Model):
 
 
 class CreatedBaseModel(Model):
-    updated_at = DateTimeField(auto_now_add=True)
-    created_at = DateTimeField(auto_now=True)
+    created_at = DateTimeField(auto_now_add=True)
+    updated_at = DateTimeField(auto_now=True)
 
     class Meta:
         abstract = True
 
 
 class ImageBaseModel(Model):
+    class ImageStatus(TextChoices):
+        PENDING = 'pending', 'Pending'
+        READY = 'ready', 'Ready'
+        FAILED = 'failed', 'Failed'
+
     image = ImageField(upload_to=upload_to_image, null=True, blank=True,
                        validators=[FileExtensionValidator(['jpeg', 'jpg', 'png', 'webp']),
                                    upload_image_size_5mb_validator],
                        help_text='jpg, png, webp are allowed')
+    image_status = CharField(max_length=10, choices=ImageStatus.choices, default=ImageStatus.READY, editable=False)
 
     class Meta:
         abstract = True
 
     def convert_img_to_webp(self):
-        is_new_upload = isinstance(self.image.file, (InMemoryUploadedFile, TemporaryUploadedFile))
-
-        if self._state.adding or is_new_upload:
-            img = Image.open(self.image)
+        """Re-encode the stored image as WebP; runs in the `convert_image_to_webp` task."""
+        with self.image.open('rb') as file:
+            img = Image.open(file)
             img = img.convert("RGB")
             buffer = BytesIO()
             img.save(buffer, format="WEBP", quality=85)
-            buffer.seek(0)
 
-            self.image = ContentFile(buffer.read(), f"{self.image.name.split('.')[0]}.webp")
-            buffer.close()
+        name = os.path.splitext(os.path.basename(self.image.name))[0]
+        self.image.save(f"{name}.webp", ContentFile(buffer.getvalue()), save=False)
+        buffer.close()
 
     # def delete_old_img(self):
     #     self.is_new_upload = isinstance(self.image.file, (InMemoryUploadedFile, TemporaryUploadedFile))
@@ -70,6 +75,18 @@ class ImageBaseModel(Model):
 
     def save(self, *, force_insert=False, force_update=False, using=None, update_fields=None):
         # self.delete_old_img()
-        if self.image:
-            self.convert_img_to_webp()
+        # uploads are stored as-is; the WebP conversion happens in a Celery worker
+        is_new_upload = bool(self.image) and not self.image._committed
+        if is_new_upload:
+            is_webp = self.image.name.lower().endswith('.webp')
+            self.image_status = self.ImageStatus.READY if is_webp else self.ImageStatus.PENDING
+            if update_fields is not None:
+                update_fields = {*update_fields, 'image_status'}
+
         super().save(force_insert=force_insert, force_update=force_update, using=using, update_fields=update_fields)
+
+        if self.image_status == self.ImageStatus.PENDING and is_new_upload:
+            from apps.tasks import convert_image_to_webp
+
+            label, pk = self._meta.label, self.pk
+            transaction.on_commit(lambda: convert_image_to_webp.delay(label, pk), using=using)
@@ -0,0 +1,28 @@
+from django.core.validators import FileExtensionValidator
+from django.db.models import ForeignKey, CASCADE, SET_NULL, FileField, JSONField
+from django.db.models.enums import TextChoices
+from django.db.models.fields import CharField, PositiveIntegerField
+
+from apps.models.base import CreatedBaseModel
+
+
+class ProductImport(CreatedBaseModel):
+    class Status(TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    user = ForeignKey('apps.User', CASCADE, related_name='product_imports')
+    seller = ForeignKey('apps.Seller', SET_NULL, null=True, blank=True, related_name='product_imports')
+    file = FileField(upload_to='imports/%Y/%m/%d', validators=[FileExtensionValidator(['csv', 'jsonl'])],
+                     help_text='csv, jsonl are allowed')
+    status = CharField(max_length=25, choices=Status.choices, default=Status.PENDING)
+    processed_rows = PositiveIntegerField(default=0)
+    created_rows = PositiveIntegerField(default=0)
+    error_count = PositiveIntegerField(default=0)
+    errors = JSONField(default=list, blank=True)
+
+    @property
+    def file_format(self):
+        return 'csv' if self.file.name.lower().endswith('.csv') else 'jsonl'
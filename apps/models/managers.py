@@ -1,5 +1,7 @@
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import UserManager
+from django.contrib.postgres.search import SearchVector
+from django.db.models import QuerySet, Subquery, OuterRef, Exists
 
 
 class CustomUserManager(UserManager):
@@ -33,4 +35,67 @@ class CustomUserManager(UserManager):
         if extra_fields.get("is_superuser") is not True:
             raise ValueError("Superuser must have is_superuser=True.")
 
-        return self._create_user(phone, email, password, **extra_fields)
\ No newline at end of file
+        return self._create_user(phone, email, password, **extra_fields)
+
+
+class ProductQuerySet(QuerySet):
+    search_config = 'simple'
+
+    def search_vector(self):
+        from apps.models import Category
+
+        category_name = Subquery(Category.objects.filter(pk=OuterRef('category_id')).order_by().values('name'))
+        return (SearchVector('name', config=self.search_config, weight='A')
+                + SearchVector(category_name, config=self.search_config, weight='B')
+                + SearchVector('description', config=self.search_config, weight='C'))
+
+    def update_search_vector(self):
+        return self.update(search_vector=self.search_vector())
+
+    def for_cart(self, user_id):
+        from apps.models import Favorite, ProductImage
+
+        is_favorite = Exists(Favorite.objects.filter(user_id=user_id, product_id=OuterRef('pk')))
+        first_image = ProductImage.objects.filter(product_id=OuterRef('pk')).order_by('id').values('image')[:1]
+        return (self.select_related('seller')
+                .defer('search_vector')
+                .annotate(is_favorite=is_favorite, first_image=Subquery(first_image)))
+
+
+class CartItemQuerySet(QuerySet):
+    def upsert(self, items):
+        """Insert or overwrite the quantity of every (cart, product) in one statement."""
+        return self.bulk_create(items, update_conflicts=True, unique_fields=['cart', 'product'],
+                                update_fields=['quantity'])
+
+    def for_listing(self):
+        from apps.models import Favorite, ProductImage
+
+        is_favorite = Exists(Favorite.objects.filter(user_id=OuterRef('cart__user_id'),
+                                                     product_id=OuterRef('product_id')))
+        first_image = ProductImage.objects.filter(product_id=OuterRef('product_id')).order_by('id').values('image')[:1]
+        return (self.select_related('product__seller')
+                .defer('product__search_vector')
+                .annotate(is_favorite=is_favorite, first_image=Subquery(first_image)))
+
+
+class FavoriteQuerySet(QuerySet):
+    def add(self, user_id, product_id):
+        """Idempotent add: one INSERT ... ON CONFLICT (user_id, product_id) DO UPDATE ... RETURNING id."""
+        favorite = self.model(user_id=user_id, product_id=product_id)
+        self.bulk_create([favorite], update_conflicts=True, unique_fields=['user', 'product'],
+                         update_fields=['product'])
+        return favorite
+
+    def add_many(self, user_id, product_ids):
+        return self.bulk_create([self.model(user_id=user_id, product_id=product_id) for product_id in product_ids],
+                                ignore_conflicts=True)
+
+    def for_listing(self):
+        """The cart quantity is not annotated here, the cart lives in Redis (see FavoriteModelSerializer)."""
+        from apps.models import ProductImage
+
+        first_image = ProductImage.objects.filter(product_id=OuterRef('product_id')).order_by('id').values('image')[:1]
+        return (self.select_related('product')
+                .defer('product__search_vector')
+                .annotate(first_image=Subquery(first_image)))
@@ -1,8 +1,11 @@
-from django.db.models import ForeignKey, CASCADE, OneToOneField
+from django.core.validators import MaxValueValidator
+from django.db.models import ForeignKey, CASCADE, OneToOneField, SET_NULL, Index, UniqueConstraint
 from django.db.models.enums import TextChoices
-from django.db.models.fields import CharField, IntegerField
+from django.db.models.fields import CharField, IntegerField, PositiveSmallIntegerField, BooleanField, \
+    DateTimeField, PositiveIntegerField, PositiveBigIntegerField
 
 from apps.models.base import CreatedBaseModel
+from apps.models.managers import CartItemQuerySet, FavoriteQuerySet
 from apps.models.utils import uz_phone_validator
 
 
@@ -10,6 +13,13 @@ class Favorite(CreatedBaseModel):
     user = ForeignKey('apps.User', CASCADE, related_name='favorites')
     product = ForeignKey('apps.Product', CASCADE, related_name='favorites')
 
+    objects = FavoriteQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['user', 'product'], name='favorite_user_product_unique'),
+        ]
+
 
 class Cart(CreatedBaseModel):
     user = OneToOneField('apps.User', CASCADE)
@@ -20,13 +30,35 @@ class CartItem(CreatedBaseModel):
     product = ForeignKey('apps.Product', CASCADE, related_name='cart_items')
     quantity = IntegerField(db_default=1)
 
+    objects = CartItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['cart', 'product'], name='cart_item_cart_product_unique'),
+        ]
+
 
 class PromoCode(CreatedBaseModel):
     code = CharField(max_length=255, unique=True)
-    # TODO qaytamiz
+    discount = PositiveSmallIntegerField(db_default=0, validators=[MaxValueValidator(100)],
+                                         help_text='percent off the order total')
+    is_active = BooleanField(db_default=True)
+    expires_at = DateTimeField(null=True, blank=True)
+    usage_limit = PositiveIntegerField(null=True, blank=True)
+    used_count = PositiveIntegerField(db_default=0, editable=False)
+
+    def __str__(self):
+        return self.code
 
 
 class Order(CreatedBaseModel):
+    class Status(TextChoices):
+        NEW = 'new', 'Yangi'
+        PROCESSING = 'processing', 'Jarayonda'
+        DELIVERING = 'delivering', 'Yetkazilmoqda'
+        DELIVERED = 'delivered', 'Yetkazildi'
+        CANCELLED = 'cancelled', 'Bekor qilindi'
+
     class PaymentType(TextChoices):
         PAYME = 'payme', 'Payme'
         CLICK = 'click', 'Click'
@@ -42,12 +74,31 @@ class Order(CreatedBaseModel):
     first_name = CharField(max_length=128)
     phone = CharField(max_length=128, validators=[uz_phone_validator])
     type = CharField(max_length=25, choices=Type.choices, default=Type.FULL_PAID)
+    status = CharField(max_length=25, choices=Status.choices, default=Status.NEW)
 
     payment_type = CharField(max_length=25, choices=PaymentType.choices)
     comment = CharField(max_length=255, null=True, blank=True)
+    promo_code = ForeignKey('apps.PromoCode', SET_NULL, null=True, blank=True, related_name='orders')
+    total_price = PositiveBigIntegerField(db_default=0)
+
+    class Meta:
+        indexes = [
+            Index(fields=['user', 'created_at', 'id']),
+            Index(fields=['user', 'status', 'created_at', 'id']),
+        ]
 
 
 class OrderItem(CreatedBaseModel):
     order = ForeignKey('apps.Order', CASCADE, related_name='order_items')
     product = ForeignKey('apps.Product', CASCADE, related_name='order_items')
+    # copied from the product at checkout, seller order history never joins products
+    seller = ForeignKey('apps.Seller', SET_NULL, null=True, blank=True, related_name='order_items')
+    # copy of order.created_at, the seller order list seeks on (seller, ordered_at, order) alone
+    ordered_at = DateTimeField(null=True, editable=False)
     price = IntegerField()
+    quantity = PositiveIntegerField(db_default=1)
+
+    class Meta:
+        indexes = [
+            Index(fields=['seller', 'ordered_at', 'order']),
+        ]
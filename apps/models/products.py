@@ -1,9 +1,12 @@
-from django.core.validators import FileExtensionValidator
-from django.db.models import JSONField, ForeignKey, CASCADE, ImageField, ManyToManyField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.core.validators import FileExtensionValidator, MaxValueValidator
+from django.db.models import JSONField, ForeignKey, CASCADE, ImageField, ManyToManyField, Index
 from django.db.models.fields import CharField, PositiveSmallIntegerField, PositiveIntegerField, TextField
 from mptt.models import MPTTModel, TreeForeignKey
 
 from apps.models.base import SlugBaseModel, CreatedBaseModel, upload_image_size_5mb_validator, ImageBaseModel
+from apps.models.managers import ProductQuerySet
 
 
 class Category(SlugBaseModel, ImageBaseModel, MPTTModel):
@@ -25,11 +28,21 @@ class Category(SlugBaseModel, ImageBaseModel, MPTTModel):
 class Product(SlugBaseModel, CreatedBaseModel):
     name = CharField(max_length=255)
     price = PositiveIntegerField()
-    discount = PositiveSmallIntegerField(db_default=0)
+    discount = PositiveSmallIntegerField(db_default=0, validators=[MaxValueValidator(100)])
     specification = JSONField(default=dict, blank=True)
     description = TextField(blank=True)
     seller = ForeignKey('apps.Seller', CASCADE, limit_choices_to={'type': 'seller'}, related_name='products')
     category = ForeignKey('apps.Category', CASCADE, related_name='products')
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            Index(fields=['price', 'id']),
+            Index(fields=['created_at', 'id']),
+            GinIndex(fields=['search_vector']),
+        ]
 
     def __str__(self):
         return self.name
@@ -1,6 +1,6 @@
 from django.contrib.auth.models import AbstractUser
-from django.db.models import CharField, TextChoices, Model, OneToOneField, CASCADE
-from django.db.models.fields import DateField, BigIntegerField
+from django.db.models import CharField, TextChoices, Model, OneToOneField, CASCADE, ForeignKey, SET_NULL, Index, Q
+from django.db.models.fields import DateField, BigIntegerField, DateTimeField
 
 from apps.models.utils import uz_phone_validator
 from apps.models.managers import CustomUserManager
@@ -26,3 +26,26 @@ class User(AbstractUser):
 class UserBalance(Model):
     user = OneToOneField('apps.User', CASCADE, related_name='user_balance')
     balance = BigIntegerField(default=0)
+
+
+class BalanceTransaction(Model):
+    """Append-only ledger entry; a row is never changed apart from being marked settled."""
+
+    class Type(TextChoices):
+        SALE = 'sale', 'Sotuv'
+        REFUND = 'refund', 'Qaytarish'
+        PAYOUT = 'payout', "To'lov"
+        ADJUSTMENT = 'adjustment', "Tuzatish"
+
+    user = ForeignKey('apps.User', CASCADE, related_name='balance_transactions')
+    amount = BigIntegerField(help_text='positive credits, negative debits')
+    type = CharField(max_length=25, choices=Type.choices)
+    order = ForeignKey('apps.Order', SET_NULL, null=True, blank=True, related_name='balance_transactions')
+    created_at = DateTimeField(auto_now_add=True)
+    settled_at = DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            Index(fields=['user', 'id']),
+            Index(fields=['id'], condition=Q(settled_at__isnull=True), name='balance_tx_unsettled_idx'),
+        ]
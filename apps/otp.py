@@ -0,0 +1,61 @@
+import secrets
+
+from django.core.cache import cache
+from rest_framework.exceptions import Throttled, ValidationError
+
+from apps.sms import queue_sms
+from apps.tasks import register_key
+
+CODE_TIMEOUT = 60
+MAX_ATTEMPTS = 5
+# (max sends, window in seconds)
+PHONE_SEND_RATE = 5, 60 * 60
+IP_SEND_RATE = 20, 60 * 60
+
+
+def attempts_key(phone):
+    return f"register:{phone}:attempts"
+
+
+def hit(key, limit, window):
+    """Count one hit in a fixed window; True while the window is within `limit`."""
+    cache.add(key, 0, window)  # SET NX EX: starts the window once
+    try:
+        return cache.incr(key) <= limit
+    except ValueError:  # the window expired between the two calls
+        cache.add(key, 1, window)
+        return True
+
+
+def issue_code(phone, ip=None):
+    """
+    Store a new registration code for `phone` and enqueue its SMS.
+
+    Returns False without enqueuing anything while an unexpired code exists.
+    Raises Throttled when the phone or the client IP ran out of sends.
+    """
+    code = secrets.randbelow(900_000) + 100_000
+    if not cache.add(register_key(phone), code, CODE_TIMEOUT):
+        return False
+
+    allowed = hit(f"otp:phone:{phone}", *PHONE_SEND_RATE)
+    if allowed and ip is not None:
+        allowed = hit(f"otp:ip:{ip}", *IP_SEND_RATE)
+    if not allowed:
+        cache.delete(register_key(phone))
+        raise Throttled(wait=CODE_TIMEOUT)
+
+    cache.delete(attempts_key(phone))
+    queue_sms(phone, f"Tasdiqlash kodi: {code}")
+    return True
+
+
+def verify_code(phone, code):
+    """Check `code` against the stored one; every code is single use and allows MAX_ATTEMPTS tries."""
+    if not hit(attempts_key(phone), MAX_ATTEMPTS, CODE_TIMEOUT):
+        raise ValidationError("Too many attempts, request a new code")
+
+    cached_code = cache.get(register_key(phone))
+    if cached_code is None or not secrets.compare_digest(str(code), str(cached_code)):
+        raise ValidationError("Wrong code")
+    cache.delete_many([register_key(phone), attempts_key(phone)])
@@ -0,0 +1,214 @@
+import json
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder cuts datetimes to milliseconds, a seek on the cut value would skip rows
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seek pagination over the view's ordering plus a unique `id` tie-breaker.
+
+    Pages are fetched with `WHERE (f1, ..., id) > (v1, ..., vn) LIMIT n`, so
+    there is no OFFSET scan and no COUNT(*), and a cursor keeps pointing at
+    the same row while new rows are inserted. The tie-breaker takes the
+    direction of the last field, so a `(f1, id)` index serves both
+    directions.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 15
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = 'id',
+    tie_breaker = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        return self.set_page([obj async for obj in page_queryset])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request, queryset)
+        self.reverse = self.cursor is not None and self.cursor['r']
+
+        ordering = self._reverse_ordering(self.ordering) if self.reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(self._seek_filter(ordering, self.cursor['p']))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+
+        self.has_next = True if self.reverse else has_more
+        self.has_previous = has_more if self.reverse else self.cursor is not None
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(request.query_params[self.page_size_query_param],
+                                 strict=True, cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        for backend in getattr(view, 'filter_backends', ()):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+
+        # no explicit ordering requested: keep the one the filters left on the queryset (e.g. search rank)
+        if not ordering:
+            query_ordering = queryset.query.order_by
+            ordering = query_ordering if all(isinstance(field, str) for field in query_ordering) else ()
+        ordering = list(ordering or self.ordering)
+
+        if self.tie_breaker not in {field.lstrip('-') for field in ordering}:
+            ordering.append(f'-{self.tie_breaker}' if ordering[-1].startswith('-') else self.tie_breaker)
+        return ordering
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, obj, reverse):
+        return replace_query_param(self.base_url, self.cursor_query_param, self.make_cursor(obj, reverse))
+
+    def make_cursor(self, obj, reverse=False):
+        position = [getattr(obj, field.lstrip('-')) for field in self.ordering]
+        payload = json.dumps({'o': self.ordering, 'p': position, 'r': reverse}, cls=CursorJSONEncoder)
+        return b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request, queryset):
+        """The cursor of the request with its position converted to field values; NotFound if it is malformed."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            cursor = json.loads(b64decode(parse.unquote(encoded).encode()))
+            valid = (isinstance(cursor, dict) and cursor.keys() == {'o', 'p', 'r'}
+                     and cursor['o'] == self.ordering and isinstance(cursor['r'], bool)
+                     and isinstance(cursor['p'], list) and len(cursor['p']) == len(self.ordering))
+            if valid:
+                cursor['p'] = [self._clean_value(queryset, field, value)
+                               for field, value in zip(self.ordering, cursor['p'])]
+        except (TypeError, ValueError, ValidationError):
+            valid = False
+        if not valid:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    @staticmethod
+    def _clean_value(queryset, field, value):
+        if value is None or isinstance(value, (list, dict)):
+            raise ValueError(value)
+        name = field.lstrip('-')
+        if name in queryset.query.annotations:
+            model_field = queryset.query.annotations[name].output_field
+        else:
+            try:
+                model_field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                return value
+        return model_field.to_python(value)
+
+    @staticmethod
+    def _reverse_ordering(ordering):
+        return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+    @staticmethod
+    def _seek_filter(ordering, position):
+        # (a, b, c) > (x, y, z)  =>  a >= x & (a > x | (a = x & b > y) | (a = x & b = y & c > z));
+        # the OR alone is no index range, the leading a >= x is what lets the scan start at the cursor
+        condition, equal = Q(), Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        first, value = ordering[0], position[0]
+        return Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": value}) & condition
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class SellerOrderPagination(KeysetPagination):
+    """
+    Seeks over one (ordered_at, order_id) row per order of the seller's items.
+
+    The item rows are DISTINCT ON that pair, so `order_id` is the tie-breaker
+    instead of the item id.
+    """
+    ordering = '-ordered_at', '-order_id'
+    tie_breaker = 'order_id'
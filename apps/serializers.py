@@ -1,20 +1,90 @@
 from django.contrib.auth.hashers import make_password
-from django.db.models import F
+from django.core.exceptions import FieldDoesNotExist
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
 from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
-from django.core.cache import cache
 
 from rest_framework.exceptions import ValidationError
 from rest_framework.fields import CharField, HiddenField, CurrentUserDefault, IntegerField, SerializerMethodField, \
-    FloatField
-from rest_framework.serializers import ModelSerializer, Serializer
+    FloatField, ChoiceField, ListField
+from rest_framework.relations import RelatedField, ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.serializers import ModelSerializer, Serializer, BaseSerializer, ListSerializer
 from rest_framework_simplejwt.serializers import TokenObtainSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from apps.models import Region, District, Category, Product, User, Order, Seller, ProductImage, CartItem, Favorite, \
-    Address
+    Address, ProductImport, OrderItem, SellerDailySales, BalanceTransaction
+
+from apps.bloom import phone_filter
+from apps.carts import cart_store, cart_items
+from apps.checkout import place_order
 from apps.models.utils import uz_phone_validator
-from apps.tasks import register_key, send_sms_code, generate_random_password
+from apps.otp import verify_code
+from apps.sms import queue_sms
+from apps.tasks import generate_random_password
+
+
+def _is_relation_path(model, attrs):
+    for attr in attrs:
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return False
+        if not field.is_relation:
+            return False
+        model = field.related_model
+    return True
+
+
+def collect_related_lookups(serializer, prefix=''):
+    """
+    Walk the serializer's readable fields and return the `select_related`
+    and `prefetch_related` lookups needed to render it without N+1 queries.
+    """
+    model = serializer.Meta.model
+    select_related, prefetch_related = [], []
+
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        attrs = field.source_attrs
+        path = prefix + '__'.join(attrs)
+
+        if isinstance(field, ListSerializer):
+            if not _is_relation_path(model, attrs):
+                continue
+            prefetch_related.append(path)
+            if isinstance(field.child, ModelSerializer):
+                child_select, child_prefetch = collect_related_lookups(field.child, path + '__')
+                prefetch_related.extend(child_select + child_prefetch)
+        elif isinstance(field, BaseSerializer):
+            if not _is_relation_path(model, attrs):
+                continue
+            select_related.append(path)
+            if isinstance(field, ModelSerializer):
+                child_select, child_prefetch = collect_related_lookups(field, path + '__')
+                select_related.extend(child_select)
+                prefetch_related.extend(child_prefetch)
+        elif isinstance(field, ManyRelatedField):
+            if _is_relation_path(model, attrs):
+                prefetch_related.append(path)
+        elif isinstance(field, RelatedField):
+            # pk-only fields are rendered from `<name>_id` and need no join
+            if not isinstance(field, PrimaryKeyRelatedField) and _is_relation_path(model, attrs):
+                select_related.append(path)
+        elif len(attrs) > 1 and _is_relation_path(model, attrs[:-1]):
+            select_related.append(prefix + '__'.join(attrs[:-1]))
+
+    return select_related, prefetch_related
+
+
+def build_image_url(name, request=None):
+    if not name:
+        return None
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
 
 
 class DynamicFieldsModelSerializer(ModelSerializer):
@@ -37,6 +107,14 @@ class DynamicFieldsModelSerializer(ModelSerializer):
             for field_name in existing - allowed:
                 self.fields.pop(field_name)
 
+    def setup_eager_loading(self, queryset):
+        select_related, prefetch_related = collect_related_lookups(self)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
 
 class RegionModelSerializer(ModelSerializer):
     class Meta:
@@ -75,16 +153,13 @@ class UserRegisterModelSerializer(ModelSerializer):
         }
 
     def validate_phone(self, value):
-        if User.objects.filter(phone=value).exists():
+        if phone_filter.might_contain(value) and User.objects.filter(phone=value).exists():
             raise ValidationError("Phone number already exists")
         return value
 
     def validate(self, attrs):
-        phone = self.initial_data.get('phone')
         code = attrs.pop('code', None)
-        cache_code = cache.get(register_key(phone))
-        if str(code) != str(cache_code):
-            raise ValidationError("Wrong code")
+        verify_code(attrs['phone'], code)
         return attrs
 
     def create(self, validated_data):
@@ -93,7 +168,7 @@ class UserRegisterModelSerializer(ModelSerializer):
         password = generate_random_password()
         validated_data['password'] = make_password(password)
         text = f"Bu sizning parolingiz {password}"
-        send_sms_code.delay(phone, text)
+        queue_sms(phone, text)
         self.user = super().create(validated_data)
         self.user.first_name = f'user-{self.user.id}'
         self.user.save(update_fields=['first_name'])
@@ -119,6 +194,17 @@ class CategoryModelSerializer(ModelSerializer):
         # }
 
 
+class CategoryTreeModelSerializer(ModelSerializer):
+    children = SerializerMethodField()
+
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'slug', 'image', 'children']
+
+    def get_children(self, obj: Category):
+        return CategoryTreeModelSerializer(obj.get_children(), many=True, context=self.context).data
+
+
 class AddressModelSerializer(ModelSerializer):
     class Meta:
         model = Address
@@ -152,21 +238,41 @@ class CustomTokenObtainPairSerializer(TokenObtainSerializer):
 class ProductImageSerializer(ModelSerializer):
     class Meta:
         model = ProductImage
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'image_status']
 
 
 class ProductImageCreateSerializer(ModelSerializer):
     class Meta:
         model = ProductImage
-        fields = ['product', 'image']
+        fields = ['id', 'product', 'image', 'image_status']
 
 
 class ProductListModelSerializer(DynamicFieldsModelSerializer):
+    category_name = CharField(source='category.name', read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'price', 'discount', 'category', 'images']
+        fields = ['id', 'name', 'price', 'discount', 'category', 'category_name', 'images']
+
+
+class ProductImportModelSerializer(ModelSerializer):
+    user = HiddenField(default=CurrentUserDefault())
+
+    class Meta:
+        model = ProductImport
+        fields = ['id', 'user', 'seller', 'file', 'status', 'processed_rows', 'created_rows', 'error_count', 'errors',
+                  'created_at']
+        read_only_fields = ['status', 'processed_rows', 'created_rows', 'error_count', 'errors']
+        extra_kwargs = {
+            'file': {'write_only': True}
+        }
+
+    def validate_seller(self, value):
+        user = self.context['request'].user
+        if value is not None and value.owner_id != user.id and not user.is_staff:
+            raise ValidationError("You are not the owner of this seller")
+        return value
 
 
 class ProductCreateModelSerializer(ModelSerializer):
@@ -212,19 +318,15 @@ class UserChangePasswordModelSerializer(ModelSerializer):
 class CartItemModelSerializer(ModelSerializer):
     class Meta:
         model = CartItem
-        fields = 'id', 'product', 'quantity'
+        fields = 'product', 'quantity'
         extra_kwargs = {
-            'quantity': {'read_only': True},
-            'product': {'write_only': True}
+            'quantity': {'min_value': 0, 'required': False},
         }
 
     def create(self, validated_data):
-        obj, updated = CartItem.objects.update_or_create(
-            defaults={'quantity': F('quantity') + 1},
-            create_defaults={'quantity': 1},
-            **validated_data
-        )
-        return obj
+        user_id, product = validated_data['user_id'], validated_data['product']
+        quantity = cart_store.add(user_id, product.pk, validated_data.get('quantity', 1))
+        return cart_items(user_id, {product.pk: quantity})[0]
 
         # cart_item, created = self.Meta.model.objects.get_or_create(**validated_data)
         # if created:
@@ -233,15 +335,23 @@ class CartItemModelSerializer(ModelSerializer):
         # cart_item.save(update_fields=['quantity'])
         # return cart_item
 
+    def update(self, instance: CartItem, validated_data):
+        if 'quantity' in validated_data:
+            instance.quantity = cart_store.set(validated_data['user_id'], instance.product_id,
+                                               validated_data['quantity'])
+        return instance
+
     def to_representation(self, instance: CartItem):
+        if not hasattr(instance, 'is_favorite'):
+            # rows read straight from the table are reloaded with the listing annotations
+            instance = CartItem.objects.for_listing().get(pk=instance.pk)
         repr_ = super().to_representation(instance)
-        user = self.context['request'].user
+        product = instance.product
 
-        repr_.update(
-            **ProductListModelSerializer(instance.product,
-                                         fields=['name', 'slug', 'price', 'discount', 'first_image']).data)
-        repr_['seller_name'] = instance.product.seller.name
-        repr_['is_favorite'] = Favorite.objects.filter(user=user, product=instance.product).exists()
+        repr_.update(name=product.name, slug=product.slug, price=product.price, discount=product.discount)
+        repr_['first_image'] = build_image_url(instance.first_image, self.context.get('request'))
+        repr_['seller_name'] = product.seller.name
+        repr_['is_favorite'] = instance.is_favorite
 
         # slug, name, price, discount, image, seller_name, quantity
         return repr_
@@ -252,21 +362,142 @@ class FavoriteModelSerializer(DynamicFieldsModelSerializer):
 
     class Meta:
         model = Favorite
-        fields = 'id', 'user'
+        fields = 'id', 'user', 'product'
+        extra_kwargs = {
+            'product': {'write_only': True}
+        }
+        # adding a favorite twice is not an error, the unique constraint is handled by the upsert
+        validators = []
+
+    def create(self, validated_data):
+        return Favorite.objects.add(validated_data['user'].pk, validated_data['product'].pk)
 
     def to_representation(self, instance: Favorite):
+        if not hasattr(instance, 'first_image'):
+            instance = Favorite.objects.for_listing().get(pk=instance.pk)
         repr_ = super().to_representation(instance)
-        repr_.update(
-            **ProductListModelSerializer(instance.product,
-                                         fields=['name', 'slug', 'price', 'discount', 'first_image']).data)
-        cart_item = CartItem.objects.filter(cart__user=instance.user, product=instance.product).only('quantity').first()
-        if cart_item:
-            repr_['quantity'] = cart_item.quantity
-        else:
-            repr_['quantity'] = 0
+        product = instance.product
+
+        repr_.update(name=product.name, slug=product.slug, price=product.price, discount=product.discount)
+        repr_['first_image'] = build_image_url(instance.first_image, self.context.get('request'))
+        repr_['quantity'] = self.get_cart_quantities(instance.user_id).get(product.pk, 0)
 
         return repr_
 
+    def get_cart_quantities(self, user_id):
+        # read once per response and kept in the context shared by a list's items; Postgres lags the cart
+        if 'cart_quantities' not in self.context:
+            self.context['cart_quantities'] = cart_store.items(user_id)
+        return self.context['cart_quantities']
+
+
+def validate_product_ids(product_ids):
+    """Check every id in one query instead of one lookup per PrimaryKeyRelatedField."""
+    missing = set(product_ids) - set(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+    if missing:
+        raise ValidationError(f"Products not found: {sorted(missing)}")
+
+
+class CartBulkItemSerializer(Serializer):
+    product = IntegerField()
+    quantity = IntegerField(min_value=0, default=1)
+
+
+class CartBulkSerializer(Serializer):
+    items = CartBulkItemSerializer(many=True, allow_empty=False, max_length=200)
+    mode = ChoiceField(choices=['add', 'set'], default='add',
+                       help_text="'add' merges into the cart (guest cart after login), 'set' overwrites quantities")
+
+    def validate_items(self, items):
+        quantities = {}
+        for item in items:
+            quantities[item['product']] = quantities.get(item['product'], 0) + item['quantity']
+        validate_product_ids(quantities)
+        return quantities
+
+    def save(self, user_id):
+        data = self.validated_data
+        return cart_store.update_many(user_id, data['items'], increment=data['mode'] == 'add')
+
+
+class FavoriteBulkSerializer(Serializer):
+    products = ListField(child=IntegerField(), allow_empty=False, max_length=500)
+
+    def validate_products(self, products):
+        products = set(products)
+        validate_product_ids(products)
+        return products
+
+    def save(self, user_id):
+        return Favorite.objects.add_many(user_id, self.validated_data['products'])
+
+
+class OrderItemModelSerializer(ModelSerializer):
+    class Meta:
+        model = OrderItem
+        fields = 'id', 'product', 'price', 'quantity'
+
+
+class CheckoutModelSerializer(ModelSerializer):
+    user = HiddenField(default=CurrentUserDefault())
+    promo_code = CharField(max_length=255, required=False, allow_blank=True, write_only=True)
+    order_items = OrderItemModelSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = 'id', 'user', 'first_name', 'phone', 'type', 'payment_type', 'comment', 'promo_code', \
+            'total_price', 'order_items', 'created_at'
+        read_only_fields = 'total_price', 'created_at'
+
+    def create(self, validated_data):
+        return place_order(**validated_data)
+
+
+class OrderItemListModelSerializer(ModelSerializer):
+    name = CharField(source='product.name', read_only=True)
+    slug = CharField(source='product.slug', read_only=True)
+
+    class Meta:
+        model = OrderItem
+        fields = 'id', 'product', 'name', 'slug', 'price', 'quantity'
+
+
+class OrderListModelSerializer(ModelSerializer):
+    order_items = OrderItemListModelSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = 'id', 'first_name', 'phone', 'type', 'status', 'payment_type', 'comment', 'total_price', \
+            'order_items', 'created_at'
+
+    @staticmethod
+    def setup_eager_loading(queryset, items=None):
+        items = OrderItem.objects.all() if items is None else items
+        items = items.select_related('product').only(
+            'id', 'order_id', 'product_id', 'price', 'quantity', 'product__name', 'product__slug')
+        return queryset.prefetch_related(Prefetch('order_items', queryset=items))
+
+
+class BalanceTransactionModelSerializer(ModelSerializer):
+    class Meta:
+        model = BalanceTransaction
+        fields = 'id', 'amount', 'type', 'order', 'created_at', 'settled_at'
+
+
+class SellerDailySalesModelSerializer(ModelSerializer):
+    class Meta:
+        model = SellerDailySales
+        fields = 'seller', 'date', 'revenue', 'quantity', 'order_count'
+
+
+class SalesSummarySerializer(Serializer):
+    id = IntegerField(source='item_id')
+    name = CharField()
+    revenue = IntegerField(source='total_revenue')
+    quantity = IntegerField(source='total_quantity')
+    order_count = IntegerField(source='total_orders')
+
+
 # class UserModelSerializer(ModelSerializer):
 #     class Meta:
 #         model = User
@@ -0,0 +1,95 @@
+from django.db import transaction, connections
+from django.db.models.signals import post_save, post_delete, pre_migrate, post_migrate
+from django.dispatch import receiver
+from mptt.signals import node_moved
+
+from apps.bloom import phone_filter
+from apps.caches import invalidate_category_tree, invalidate_cached_user
+from apps.ledger import open_accounts
+from apps.models import Category, Product, User, CartItem, Favorite
+from apps.tasks import update_category_search_vectors
+
+SEARCH_VECTOR_SOURCE_FIELDS = {'name', 'description', 'category', 'category_id'}
+
+# the oldest row of every duplicated (cart, product) takes the summed quantity, the rest go
+MERGE_CART_ITEMS_SQL = f"""
+    WITH duplicates AS (
+        SELECT cart_id, product_id, min(id) AS kept_id, sum(quantity) AS quantity
+        FROM {CartItem._meta.db_table} GROUP BY cart_id, product_id HAVING count(*) > 1
+    ), merged AS (
+        UPDATE {CartItem._meta.db_table} item SET quantity = duplicates.quantity
+        FROM duplicates WHERE item.id = duplicates.kept_id
+    )
+    DELETE FROM {CartItem._meta.db_table} item USING duplicates
+    WHERE item.cart_id = duplicates.cart_id AND item.product_id = duplicates.product_id
+      AND item.id <> duplicates.kept_id
+"""
+MERGE_FAVORITES_SQL = f"""
+    DELETE FROM {Favorite._meta.db_table} favorite USING {Favorite._meta.db_table} older
+    WHERE favorite.user_id = older.user_id AND favorite.product_id = older.product_id AND favorite.id > older.id
+"""
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(node_moved, sender=Category)
+def category_tree_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_category_tree)
+
+
+@receiver(post_save, sender=Category)
+def category_renamed(sender, instance: Category, created, raw, update_fields=None, **kwargs):
+    if created or raw or (update_fields is not None and 'name' not in update_fields):
+        return
+    transaction.on_commit(lambda: update_category_search_vectors.delay(instance.pk))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance: User, **kwargs):
+    # drop it now and again on commit, a concurrent request may re-cache the old row in between
+    user_id = instance.pk
+
+    invalidate_cached_user(user_id)
+    transaction.on_commit(lambda: invalidate_cached_user(user_id))
+
+
+@receiver(post_save, sender=User)
+def user_phone_registered(sender, instance: User, raw, update_fields=None, **kwargs):
+    # a changed phone is added too; the old one stays a false positive until the next rebuild
+    if raw or (update_fields is not None and 'phone' not in update_fields):
+        return
+    phone = instance.phone
+    transaction.on_commit(lambda: phone_filter.add(phone))
+
+
+@receiver(post_save, sender=Product)
+def product_search_vector(sender, instance: Product, raw, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and SEARCH_VECTOR_SOURCE_FIELDS.isdisjoint(update_fields)):
+        return
+    Product.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_migrate)
+def open_ledger_accounts(sender, using, **kwargs):
+    if sender.name == 'apps':
+        open_accounts(using)
+
+
+@receiver(pre_migrate)
+def merge_duplicate_rows(sender, using, **kwargs):
+    """
+    Rows from before the (cart, product) and (user, product) unique constraints
+    may repeat; merge them so migrate can add the constraints.
+    """
+    if sender.name != 'apps':
+        return
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+        for model, sql in ((CartItem, MERGE_CART_ITEMS_SQL), (Favorite, MERGE_FAVORITES_SQL)):
+            if model._meta.db_table not in tables:
+                continue
+            constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+            if not {constraint.name for constraint in model._meta.constraints} <= constraints.keys():
+                cursor.execute(sql)
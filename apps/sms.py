@@ -0,0 +1,200 @@
+import asyncio
+import json
+from dataclasses import dataclass
+from time import monotonic
+
+import httpx
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from apps.utils import logger, get_redis
+
+OUTBOX_KEY = 'sms:outbox'
+# the batch being sent; a flush that dies mid-batch leaves it here for the next one
+PROCESSING_KEY = 'sms:processing'
+DEAD_LETTER_KEY = 'sms:dead'
+FLUSH_SCHEDULED_KEY = 'sms:flush-scheduled'
+FLUSH_LOCK_KEY = 'sms:flush-lock'
+FLUSH_LOCK_TIMEOUT = 5 * 60
+
+
+@dataclass
+class SMSMessage:
+    phone: str
+    text: str
+
+
+class SMSDeliveryError(Exception):
+    pass
+
+
+class SMSRejectedError(SMSDeliveryError):
+    """The provider refused the batch, sending it again won't help."""
+
+
+class BaseSMSProvider:
+    """
+    A provider sends a batch of messages over a shared `httpx.AsyncClient`.
+    Raise SMSDeliveryError for failures worth retrying and SMSRejectedError
+    for the ones that aren't.
+    """
+    max_batch_size = 100
+    rate_limit = 50  # messages per second
+    max_concurrency = 4
+
+    async def send_batch(self, client: httpx.AsyncClient, messages: list[SMSMessage]):
+        raise NotImplementedError
+
+
+class FakeSMSProvider(BaseSMSProvider):
+    """Logs messages instead of sending them; `latency` simulates a remote API in benchmarks."""
+    rate_limit = 10_000
+    latency = 0.0
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_batch(self, client, messages):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent.extend(messages)
+        for message in messages:
+            logger.info(f"📞 {message.phone}\n{message.text}")
+
+
+class HTTPSMSProvider(BaseSMSProvider):
+    """Posts batches as JSON to `SMS_PROVIDER_URL` with a bearer `SMS_PROVIDER_TOKEN`."""
+
+    def __init__(self):
+        self.url = settings.SMS_PROVIDER_URL
+        self.token = settings.SMS_PROVIDER_TOKEN
+
+    async def send_batch(self, client, messages):
+        payload = {'messages': [{'to': message.phone, 'text': message.text} for message in messages]}
+        try:
+            response = await client.post(self.url, json=payload, headers={'Authorization': f'Bearer {self.token}'})
+        except httpx.TransportError as exc:
+            raise SMSDeliveryError(str(exc)) from exc
+        if response.status_code == 429 or response.status_code >= 500:
+            raise SMSDeliveryError(f'{response.status_code}: {response.text[:200]}')
+        if response.status_code >= 400:
+            raise SMSRejectedError(f'{response.status_code}: {response.text[:200]}')
+
+
+class RateLimiter:
+    """Token bucket shared by the coroutines of one dispatch."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated_at = monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount):
+        async with self.lock:
+            while True:
+                now = monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= min(amount, self.rate):
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((min(amount, self.rate) - self.tokens) / self.rate)
+
+
+class SMSDispatcher:
+    max_retries = 3
+    retry_backoff = 0.5  # seconds, doubled on every retry
+    timeout = 10
+
+    def __init__(self, provider: BaseSMSProvider = None):
+        self.provider = provider or import_string(settings.SMS_PROVIDER)()
+
+    def dispatch(self, messages):
+        """Send `messages` and return the ones that still failed after all retries."""
+        return asyncio.run(self._dispatch(messages))
+
+    async def _dispatch(self, messages):
+        provider = self.provider
+        size = provider.max_batch_size
+        batches = [messages[i:i + size] for i in range(0, len(messages), size)]
+        limiter = RateLimiter(provider.rate_limit)
+        semaphore = asyncio.Semaphore(provider.max_concurrency)
+        limits = httpx.Limits(max_connections=provider.max_concurrency,
+                              max_keepalive_connections=provider.max_concurrency)
+
+        async with httpx.AsyncClient(limits=limits, timeout=self.timeout) as client:
+            async def send(batch):
+                async with semaphore:
+                    return await self._send_with_retries(client, limiter, batch)
+
+            results = await asyncio.gather(*(send(batch) for batch in batches))
+        return [message for failed in results for message in failed]
+
+    async def _send_with_retries(self, client, limiter, batch):
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire(len(batch))
+            try:
+                await self.provider.send_batch(client, batch)
+                return []
+            except SMSRejectedError as exc:
+                logger.warning(f"SMS batch of {len(batch)} rejected: {exc}")
+                return batch
+            except SMSDeliveryError as exc:
+                logger.warning(f"SMS batch of {len(batch)} failed (attempt {attempt + 1}): {exc}")
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+        return batch
+
+
+def queue_sms(phone, text):
+    """Add a message to the outbox; a flush is scheduled once a batch is full."""
+    from apps.tasks import flush_sms_outbox
+
+    redis = get_redis()
+    length = redis.rpush(OUTBOX_KEY, json.dumps({'phone': str(phone), 'text': text}))
+    if length >= settings.SMS_BATCH_SIZE and redis.set(FLUSH_SCHEDULED_KEY, 1, nx=True, ex=30):
+        flush_sms_outbox.delay()
+
+
+def claim_batch(redis, size):
+    """Move up to `size` messages from the outbox to the processing list in one MULTI/EXEC."""
+    pipe = redis.pipeline()
+    for _ in range(size):
+        pipe.lmove(OUTBOX_KEY, PROCESSING_KEY, 'LEFT', 'RIGHT')
+    return [item for item in pipe.execute() if item is not None]
+
+
+def flush_outbox(dispatcher: SMSDispatcher = None):
+    """
+    Drain the outbox in batches of SMS_BATCH_SIZE; returns the number of messages handled.
+
+    A batch stays in the processing list until it was sent or dead-lettered,
+    so a worker crash re-sends it on the next flush instead of losing it.
+    One flush runs at a time.
+    """
+    redis = get_redis()
+    redis.delete(FLUSH_SCHEDULED_KEY)
+    lock = redis.lock(FLUSH_LOCK_KEY, timeout=FLUSH_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        return 0
+    dispatcher = dispatcher or SMSDispatcher()
+
+    handled = 0
+    try:
+        raw = redis.lrange(PROCESSING_KEY, 0, -1) or claim_batch(redis, settings.SMS_BATCH_SIZE)
+        while raw:
+            messages = [SMSMessage(**json.loads(item)) for item in raw]
+            failed = dispatcher.dispatch(messages)
+            pipe = redis.pipeline()
+            if failed:
+                pipe.rpush(DEAD_LETTER_KEY, *(json.dumps(message.__dict__) for message in failed))
+            pipe.delete(PROCESSING_KEY)
+            pipe.execute()
+            handled += len(messages)
+
+            lock.reacquire()
+            raw = claim_batch(redis, settings.SMS_BATCH_SIZE)
+    finally:
+        lock.release()
+    return handled
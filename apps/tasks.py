@@ -2,7 +2,6 @@ import random
 import string
 
 from celery import shared_task
-from django.core.cache import cache
 
 from apps.utils import logger
 
@@ -13,18 +12,106 @@ def register_key(phone):
 
 @shared_task
 def send_sms_code(phone, msg):
-    logger.info(f"📞 {phone}\n{msg}")
+    from apps.sms import queue_sms
+
+    queue_sms(phone, msg)
+
+
+@shared_task(ignore_result=True)
+def flush_sms_outbox():
+    from apps.sms import flush_outbox
+
+    return flush_outbox()
+
+
+@shared_task
+def update_category_search_vectors(category_id):
+    from apps.models import Product
+
+    Product.objects.filter(category_id=category_id).update_search_vector()
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def convert_image_to_webp(self, model_label, pk):
+    from django.apps import apps
+    from PIL import UnidentifiedImageError
+
+    model = apps.get_model(model_label)
+    obj = model.objects.filter(pk=pk).first()
+    if obj is None or obj.image_status != model.ImageStatus.PENDING:
+        return
+
+    original = obj.image.name
+    try:
+        obj.convert_img_to_webp()
+    except Exception as exc:
+        # storage errors may pass, a file Pillow can't decode fails the same way on every attempt
+        retryable = isinstance(exc, OSError) and not isinstance(exc, UnidentifiedImageError)
+        if retryable and self.request.retries < self.max_retries:
+            raise self.retry(exc=exc)
+        logger.exception(f"{model_label}:{pk} image can not be converted")
+        model.objects.filter(pk=pk).update(image_status=model.ImageStatus.FAILED)
+        return
+
+    obj.image_status = model.ImageStatus.READY
+    obj.save(update_fields=['image', 'image_status'])
+    obj.image.storage.delete(original)
+
+
+@shared_task
+def import_products(import_id):
+    from apps.imports import ProductImporter
+    from apps.models import ProductImport
+
+    job = ProductImport.objects.select_related('user').get(pk=import_id)
+    job.status = ProductImport.Status.RUNNING
+    job.save(update_fields=['status'])
+
+    def report(result):
+        ProductImport.objects.filter(pk=import_id).update(
+            processed_rows=result.processed, created_rows=result.created, error_count=result.error_count)
+
+    # staff may import for any seller, everyone else only for their own
+    owner_id = None if job.user.is_staff else job.user_id
+    importer = ProductImporter(seller_id=job.seller_id, owner_id=owner_id, on_progress=report)
+    try:
+        with job.file.open('rb') as file:
+            result = importer.run(file, job.file_format)
+    except Exception:
+        ProductImport.objects.filter(pk=import_id).update(status=ProductImport.Status.FAILED)
+        raise
+
+    ProductImport.objects.filter(pk=import_id).update(
+        status=ProductImport.Status.DONE, processed_rows=result.processed, created_rows=result.created,
+        error_count=result.error_count, errors=result.errors)
+
+
+@shared_task(ignore_result=True)
+def flush_carts():
+    from apps.carts import cart_store
+
+    return cart_store.flush_dirty()
+
+
+@shared_task(ignore_result=True)
+def update_sales_rollups():
+    from apps.analytics import update_sales_rollups
+
+    return update_sales_rollups()
+
+
+@shared_task(ignore_result=True)
+def settle_balance_ledger():
+    from apps.ledger import settle
+
+    return settle()
 
 
 @shared_task
 def register_sms(phone: str):
-    code = random.randint(100000, 999999)
-    key = register_key(phone)
-    if not cache.get(key):
-        cache.set(key, code, 60)
+    from apps.otp import issue_code
 
-    text = f"Tasdiqlash kodi: {code}"
-    send_sms_code.delay(phone, text)
+    issue_code(phone)
 
 
 #
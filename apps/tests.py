@@ -1,3 +1,955 @@
-from django.test import TestCase
+import asyncio
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import threading
+from base64 import b64encode
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from PIL import Image
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.analytics import update_sales_rollups
+from apps.bloom import phone_filter
+from apps.caches import user_cache_key, ReferenceDataCache, CATEGORY_TREE_VERSION_KEY
+from apps.carts import cart_store
+from apps.checkout import place_order, change_order_status, discounted_price
+from apps.ledger import settle
+from apps.models import Category, Product, ProductImage, Seller, User, Favorite, Cart, CartItem, ProductImport, Order, \
+    OrderItem, UserBalance, BalanceTransaction, PromoCode, SellerDailySales, ProductDailySales, CategoryDailySales, \
+    Region, District
+from apps.otp import IP_SEND_RATE
+from apps.serializers import ProductCreateModelSerializer
+from apps.sms import FakeSMSProvider, HTTPSMSProvider, SMSDispatcher, SMSMessage, SMSRejectedError, queue_sms, \
+    flush_outbox, claim_batch, DEAD_LETTER_KEY, OUTBOX_KEY, PROCESSING_KEY
+from apps.signals import open_ledger_accounts, merge_duplicate_rows
+from apps.tasks import convert_image_to_webp, import_products, update_category_search_vectors
+from apps.utils import get_redis
+from apps.views import UserCheckPhoneAPIView
+from root import settings as root_settings
+from root.health import monitor
+from root.metrics import latency_histograms, render_metrics
+
+
+def create_user(phone='901234567', **kwargs):
+    return User.objects.create_user(phone=phone, password='password', **kwargs)
+
+
+def create_seller(phone='909999999', name='Shop'):
+    return Seller.objects.create(name=name, owner=create_user(phone), address='Tashkent')
+
+
+def create_products(count, seller=None, category=None, images=2):
+    seller = seller or Seller.objects.filter(name='Shop').first() or create_seller()
+    category = category or Category.objects.filter(name='Phones').first() or Category.objects.create(name='Phones')
+    products = []
+    start = Product.objects.count()
+    for i in range(start, start + count):
+        product = Product.objects.create(name=f'Product {i}', price=1_000 + i, seller=seller, category=category)
+        ProductImage.objects.bulk_create([ProductImage(product=product, image=f'products/{i}-{n}.webp')
+                                          for n in range(images)])
+        products.append(product)
+    return products
+
+
+class QueryCountTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries), response
+
+    def assertConstantQueries(self, url, grow, **params):
+        """The request costs the same number of queries before and after `grow()` adds rows."""
+        before, _ = self.count_queries(url, **params)
+        grow()
+        after, response = self.count_queries(url, **params)
+        self.assertEqual(before, after)
+        return response
+
+
+class ProductListQueryTest(QueryCountTestCase):
+    url = '/api/v1/products/'
+
+    def test_page_size_does_not_change_query_count(self):
+        create_products(2)
+        small, _ = self.count_queries(self.url, page_size=2)
+        create_products(20)
+        cache.clear()
+        large, response = self.count_queries(self.url, page_size=20)
+
+        self.assertEqual(small, large)
+        product = response.data['results'][0]
+        self.assertEqual(product['category_name'], 'Phones')
+        self.assertEqual(len(product['images']), 2)
+
+
+class KeysetPaginationTest(APITestCase):
+    url = '/api/v1/products/'
+
+    def setUp(self):
+        cache.clear()
+        create_products(3, images=0)
+
+    @staticmethod
+    def cursor(payload):
+        return b64encode(json.dumps(payload).encode()).decode()
+
+    def test_next_link_continues_after_the_last_row(self):
+        first = self.client.get(self.url, {'page_size': 2}).data
+        second = self.client.get(first['next']).data
+        self.assertEqual([p['id'] for p in first['results'] + second['results']],
+                         list(Product.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_descending_pages_seek_from_an_index_bound(self):
+        create_products(3, images=0)
+        Product.objects.filter(price__gt=1_002).update(price=1_002)
+        expected = list(Product.objects.order_by('-price', '-id').values_list('id', flat=True))
+
+        ids, url = [], self.url + '?ordering=-price&page_size=2'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get(url).data
+            ids += [p['id'] for p in data['results']]
+            url = data['next']
+        self.assertEqual(ids, expected)
+        sql = next(query['sql'] for query in queries if 'ORDER BY' in query['sql'])
+        self.assertIn('"apps_product"."price" <= 1002', sql)
+        self.assertIn('"apps_product"."id" DESC', sql)
+
+    def test_malformed_cursor_is_not_found(self):
+        cursors = [
+            'not base64 json',
+            self.cursor([1, 2]),
+            self.cursor({'o': ['id'], 'p': [1]}),
+            self.cursor({'o': ['id'], 'p': [1], 'r': 'yes'}),
+            self.cursor({'o': ['id'], 'p': 1, 'r': False}),
+            self.cursor({'o': ['id'], 'p': ['abc'], 'r': False}),
+            self.cursor({'o': ['id'], 'p': [None], 'r': False}),
+            self.cursor({'o': ['-price', 'id'], 'p': [[1], 2], 'r': False}),
+            self.cursor({'o': ['-created_at', 'id'], 'p': ['yesterday', 2], 'r': False}),
+        ]
+        for cursor in cursors:
+            for ordering in ('id', '-price', '-created_at'):
+                with self.subTest(cursor=cursor, ordering=ordering):
+                    response = self.client.get(self.url, {'cursor': cursor, 'ordering': ordering})
+                    self.assertEqual(response.status_code, 404)
+
+
+class FullTextSearchTest(APITestCase):
+    url = '/api/v1/products/'
+
+    def setUp(self):
+        cache.clear()
+        self.seller, self.category = create_seller(), Category.objects.create(name='Computers')
+        # created first, so only the rank can put it after the stand
+        self.sleeve = self.create('Sleeve', description='fits any laptop')
+        self.stand = self.create('Laptop stand')
+        self.create('Phone')
+
+    def create(self, name, description=''):
+        return Product.objects.create(name=name, description=description, price=1_000, seller=self.seller,
+                                      category=self.category)
+
+    def search(self, term, **params):
+        return [p['id'] for p in self.client.get(self.url, {'search': term, **params}).data['results']]
+
+    def test_last_term_matches_a_prefix_and_names_rank_first(self):
+        self.assertEqual(self.search('lapt'), [self.stand.pk, self.sleeve.pk])
+        self.assertEqual(self.search('stand lapt'), [self.stand.pk])
+        self.assertEqual(self.search('lap stand'), [])
+
+    def test_cursor_pages_through_the_ranked_results(self):
+        first = self.client.get(self.url, {'search': 'laptop', 'page_size': 1}).data
+        second = self.client.get(first['next']).data
+        self.assertEqual([p['id'] for p in first['results'] + second['results']], [self.stand.pk, self.sleeve.pk])
+        self.assertIsNone(second['next'])
+
+    def test_search_vector_follows_product_and_category_edits(self):
+        self.stand.name = 'Monitor stand'
+        self.stand.save()
+        self.assertEqual(self.search('monitor'), [self.stand.pk])
+        self.assertEqual(self.search('lapt'), [self.sleeve.pk])
+
+        self.category.name = 'Notebooks'
+        with mock.patch.object(update_category_search_vectors, 'delay',
+                               lambda pk: update_category_search_vectors.apply(args=[pk])):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.category.save()
+        self.assertEqual(len(self.search('notebooks')), 3)
+
+
+class CategoryTreeTest(APITestCase):
+    url = '/api/v1/categories/tree/'
+
+    def setUp(self):
+        cache.clear()
+        self.phones = Category.objects.create(name='Phones')
+        Category.objects.create(name='Smartphones', parent=self.phones)
+
+    def test_edit_bumps_the_version_and_rebuilds_the_tree(self):
+        self.assertEqual(self.client.get(self.url).data[0]['children'][0]['name'], 'Smartphones')
+        version = cache.get(CATEGORY_TREE_VERSION_KEY)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/v1/categories/{self.phones.pk}/', {'name': 'Mobile'})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(cache.get(CATEGORY_TREE_VERSION_KEY), version)
+        tree = self.client.get(self.url).data
+        self.assertEqual((tree[0]['name'], tree[0]['children'][0]['name']), ('Mobile', 'Smartphones'))
+
+
+class ReferenceDataTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        # a fresh per-process copy, the module one may hold another test's tables
+        self.worker = ReferenceDataCache()
+        self.enterContext(mock.patch('apps.views.reference_data', self.worker))
+        self.region = Region.objects.create(name='Toshkent')
+        District.objects.create(name='Chilonzor', region=self.region)
+
+    def test_matching_etag_is_not_modified(self):
+        for url in ('/api/v1/regions/', '/api/v1/districts/', f'/api/v1/districts/?region_id={self.region.pk}'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                etag = response['ETag']
+
+                response = self.client.get(url, headers={'If-None-Match': etag})
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertFalse(response.content)
+
+    def test_other_workers_reload_after_the_version_bump(self):
+        self.worker.check_interval = 0
+        etag = self.client.get('/api/v1/regions/')['ETag']
+        Region.objects.create(name='Samarqand')  # loaddata, no signal reaches the workers
+        self.assertEqual(len(self.client.get('/api/v1/regions/').data), 1)
+
+        # run in another process, it only shares the version in Redis with this worker
+        call_command('reload_reference_data', stdout=StringIO())
+        response = self.client.get('/api/v1/regions/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+
+
+class ProductFacetsTest(APITestCase):
+    url = '/api/v1/products/'
+
+    def setUp(self):
+        cache.clear()
+        self.products = create_products(2, images=0)
+
+    def test_facets_are_opt_in(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('facets', response.data)
+        self.assertFalse(any('GROUPING' in query['sql'] for query in queries))
+
+    def test_facets_count_the_filtered_products(self):
+        response = self.client.get(self.url, {'facets': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['facets']['categories'],
+                         [{'id': self.products[0].category_id, 'name': 'Phones', 'count': 2}])
+
+    def test_unknown_category_has_empty_facets(self):
+        response = self.client.get(self.url, {'category': 999_999, 'facets': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(response.data['facets'], {'categories': [], 'sellers': [], 'prices': []})
+
+
+class CartListQueryTest(QueryCountTestCase):
+    url = '/api/v1/users/carts/'
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def add_to_cart(self, products):
+        cart_store.update_many(self.user.pk, {product.pk: 2 for product in products})
+
+    def test_cart_size_does_not_change_query_count(self):
+        self.add_to_cart(create_products(2))
+
+        def grow():
+            products = create_products(20)
+            self.add_to_cart(products)
+            Favorite.objects.add_many(self.user.pk, [product.pk for product in products])
+
+        response = self.assertConstantQueries(self.url, grow)
+        self.assertEqual(len(response.data), 22)
+        self.assertEqual(sum(item['is_favorite'] for item in response.data), 20)
+        self.assertEqual({item['seller_name'] for item in response.data}, {'Shop'})
+        self.assertTrue(all(item['first_image'] for item in response.data))
+
+
+class FavoriteListQueryTest(QueryCountTestCase):
+    url = '/api/v1/users/favorites/'
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        cart_store.items(self.user.pk)  # load the cart first, both requests then find it in Redis
+
+    def test_favorite_count_does_not_change_query_count(self):
+        Favorite.objects.add_many(self.user.pk, [product.pk for product in create_products(2)])
+
+        def grow():
+            products = create_products(20)
+            Favorite.objects.add_many(self.user.pk, [product.pk for product in products])
+            # not flushed yet, the listing must still show these quantities
+            cart_store.update_many(self.user.pk, {product.pk: 3 for product in products})
+
+        response = self.assertConstantQueries(self.url, grow)
+        self.assertEqual(response.data['count'], 22)
+        self.assertEqual({item['quantity'] for item in response.data['results']}, {3})
+        self.assertTrue(all(item['first_image'] for item in response.data['results']))
+
+
+class BulkQueryTest(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        cart_store.items(self.user.pk)  # load the cart first, both requests then find it in Redis
+
+    def post_queries(self, url, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries), response
+
+    def test_cart_bulk_size_does_not_change_query_count(self):
+        url = '/api/v1/users/carts/bulk/'
+        small, _ = self.post_queries(url, {'items': [{'product': p.pk, 'quantity': 1} for p in create_products(2)]})
+        products = create_products(40)
+        large, response = self.post_queries(url, {'items': [{'product': p.pk, 'quantity': 2} for p in products]})
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.data), 42)
+
+    def test_favorite_bulk_size_does_not_change_query_count(self):
+        url = '/api/v1/users/favorites/bulk/'
+        small, _ = self.post_queries(url, {'products': [p.pk for p in create_products(2)]})
+        large, response = self.post_queries(url, {'products': [p.pk for p in create_products(40)]})
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.data), 40)
+
+
+class SellerOrderListQueryTest(QueryCountTestCase):
+    url = '/api/v1/sellers/orders/'
+
+    def setUp(self):
+        super().setUp()
+        self.seller = create_seller()
+        self.customer = create_user('901111111')
+        self.client.force_authenticate(self.seller.owner)
+
+    def place_orders(self, count):
+        products = create_products(2, seller=self.seller, images=0)
+        for _ in range(count):
+            cart_store.update_many(self.customer.pk, {product.pk: 1 for product in products})
+            with self.captureOnCommitCallbacks(execute=True):
+                place_order(self.customer, first_name='Ali', phone='901111111', payment_type='payme')
+
+    def test_order_count_does_not_change_query_count(self):
+        self.place_orders(2)
+        response = self.assertConstantQueries(self.url, lambda: self.place_orders(20), page_size=5)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertTrue(all(len(order['order_items']) == 2 for order in response.data['results']))
+
+    def test_pages_list_every_order_once_newest_first(self):
+        self.place_orders(7)
+        ids, url, params = [], self.url, {'page_size': 3}
+        while url:
+            data = self.client.get(url, params).data
+            ids += [order['id'] for order in data['results']]
+            url, params = data['next'], None
+        self.assertEqual(ids, list(Order.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+
+class TimestampTest(TestCase):
+    def test_saving_keeps_created_at(self):
+        seller = create_seller()
+        created_at = seller.created_at
+        seller.save()
+        seller.refresh_from_db()
+        self.assertEqual(seller.created_at, created_at)
+        self.assertGreater(seller.updated_at, created_at)
+
+    def test_repair_command_swaps_timestamps_and_dates_order_items(self):
+        customer = create_user()
+        order = Order.objects.create(user=customer, first_name='Ali', phone='901234567', payment_type='payme')
+        item = OrderItem.objects.create(order=order, product=create_products(1, images=0)[0], price=1_000)
+        created_at, updated_at = order.created_at, order.created_at + timedelta(days=1)
+        Order.objects.filter(pk=order.pk).update(created_at=updated_at, updated_at=created_at)
+
+        call_command('repair_timestamps', stdout=StringIO())
+        call_command('repair_timestamps', stdout=StringIO())
+        order.refresh_from_db()
+        item.refresh_from_db()
+        self.assertEqual((order.created_at, order.updated_at), (created_at, updated_at))
+        self.assertEqual(item.ordered_at, created_at)
+
+
+class CheckoutTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_flush_after_checkout_does_not_bring_bought_items_back(self):
+        user = create_user()
+        cart_store.update_many(user.pk, {product.pk: 1 for product in create_products(2, images=0)})
+        # the test transaction never commits, so this flush runs where a blocked one would: before on_commit
+        place_order(user, first_name='Ali', phone='901234567', payment_type='payme')
+        cart_store.flush_dirty()
+
+        self.assertFalse(CartItem.objects.filter(cart__user=user).exists())
+        self.assertEqual(cart_store.items(user.pk), {})
+
+    def test_add_after_the_checkout_flush_stays_in_the_cart(self):
+        user = create_user()
+        bought, late = create_products(2, images=0)
+        cart_store.set(user.pk, bought.pk, 1)
+        flush = cart_store.flush
+
+        def flush_then_add(user_ids):
+            flushed = flush(user_ids)
+            cart_store.set(user.pk, late.pk, 2)
+            return flushed
+
+        with mock.patch.object(cart_store, 'flush', flush_then_add):
+            order = place_order(user, first_name='Ali', phone='901234567', payment_type='payme')
+        cart_store.flush_dirty()
+
+        self.assertEqual(list(OrderItem.objects.filter(order=order).values_list('product_id', flat=True)), [bought.pk])
+        self.assertEqual(cart_store.items(user.pk), {late.pk: 2})
+        self.assertEqual(list(CartItem.objects.filter(cart__user=user).values_list('product_id', 'quantity')),
+                         [(late.pk, 2)])
+
+
+class SalesRollupTest(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.product = create_products(1, images=0)[0]
+
+    def order(self, quantity, age=timedelta(days=1)):
+        order = Order.objects.create(user=self.user, first_name='Ali', phone='901234567', payment_type='payme')
+        item = OrderItem.objects.create(order=order, product=self.product, seller=self.product.seller,
+                                        price=self.product.price, quantity=quantity)
+        OrderItem.objects.filter(pk=item.pk).update(created_at=timezone.now() - age)
+        return order
+
+    def totals(self, model=SellerDailySales):
+        return model.objects.aggregate(revenue=Sum('revenue'), quantity=Sum('quantity'), orders=Sum('order_count'))
+
+    def expected(self, quantity, orders):
+        return {'revenue': self.product.price * quantity, 'quantity': quantity, 'orders': orders}
+
+    def test_runs_add_only_new_orders(self):
+        self.order(2)
+        self.assertGreater(update_sales_rollups(), 0)
+        self.order(3)
+        update_sales_rollups(batch_size=1)
+        self.assertEqual(self.totals(), self.expected(5, 2))
+
+        self.assertEqual(update_sales_rollups(), 0)
+        self.assertEqual(self.totals(), self.expected(5, 2))
+        for model in (ProductDailySales, CategoryDailySales):
+            self.assertEqual(self.totals(model), self.expected(5, 2))
+
+    def test_items_inside_the_lag_window_wait_for_a_later_run(self):
+        self.order(2)
+        fresh = self.order(3, age=timedelta())
+        update_sales_rollups()
+        self.assertEqual(self.totals(), self.expected(2, 1))
+
+        OrderItem.objects.filter(order=fresh).update(created_at=timezone.now() - timedelta(minutes=5))
+        update_sales_rollups()
+        self.assertEqual(self.totals(), self.expected(5, 2))
+
+    def test_rebuild_recounts_the_whole_history(self):
+        self.order(2)
+        self.order(3)
+        update_sales_rollups()
+        SellerDailySales.objects.update(revenue=0, quantity=0, order_count=0)
+
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        for model in (SellerDailySales, ProductDailySales, CategoryDailySales):
+            self.assertEqual(self.totals(model), self.expected(5, 2))
+
+
+class CachedJWTAuthenticationTest(APITestCase):
+    url = '/api/v1/users/get-me/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+
+    def get(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        return self.client.get(self.url)
+
+    def test_user_is_read_from_the_cache(self):
+        self.assertEqual(self.get().status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get().status_code, 200)
+        self.assertFalse(any('"apps_user"' in query['sql'] for query in queries))
+
+    def test_saving_the_user_evicts_it(self):
+        self.get()
+        self.user.first_name = 'Vali'
+        self.user.save()
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertEqual(self.get().data['first_name'], 'Vali')
+
+    def test_deactivated_user_is_rejected_unless_the_check_is_off(self):
+        self.get()
+        self.user.is_active = False
+        self.user.save()
+        for _ in range(2):  # the inactive row is cached by the first rejection
+            self.assertEqual(self.get().status_code, 401)
+        with mock.patch.object(jwt_settings, 'CHECK_USER_IS_ACTIVE', False):
+            self.assertEqual(self.get().status_code, 200)
+
+    def test_password_change_revokes_tokens_of_the_cached_user(self):
+        # simplejwt rebinds its settings object on override_settings, so patch the one that is read
+        with mock.patch.object(jwt_settings, 'CHECK_REVOKE_TOKEN', True):
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+            self.user.set_password('new password')
+            self.user.save()
+            self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class DuplicateRowsTest(TestCase):
+    def drop_unique_constraint(self, model):
+        with connection.schema_editor() as editor:
+            editor.remove_constraint(model, model._meta.constraints[0])
+
+    def test_migrate_merges_duplicates_before_adding_the_constraints(self):
+        user, (first, second) = create_user(), create_products(2, images=0)
+        cart = Cart.objects.create(user=user)
+        self.drop_unique_constraint(CartItem)
+        self.drop_unique_constraint(Favorite)
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=first, quantity=quantity) for quantity in (1, 2, 3)]
+                                     + [CartItem(cart=cart, product=second, quantity=5)])
+        Favorite.objects.bulk_create([Favorite(user=user, product=first) for _ in range(3)])
+
+        merge_duplicate_rows(django_apps.get_app_config('apps'), using='default')
+        self.assertEqual(dict(CartItem.objects.values_list('product_id', 'quantity')), {first.pk: 6, second.pk: 5})
+        self.assertEqual(Favorite.objects.count(), 1)
+
+
+class ConcurrentAddTest(TransactionTestCase):
+    workers = 8
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.product = create_products(1, images=0)[0]
+
+    def run_in_parallel(self, add):
+        barrier = threading.Barrier(self.workers)
+
+        def worker():
+            try:
+                barrier.wait()
+                add()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_parallel_cart_adds_write_one_row(self):
+        def add():
+            cart_store.add(self.user.pk, self.product.pk)
+            cart_store.flush([self.user.pk])
+
+        self.run_in_parallel(add)
+        self.assertEqual(list(CartItem.objects.values_list('product_id', 'quantity')),
+                         [(self.product.pk, self.workers)])
+
+    def test_parallel_favorite_adds_write_one_row(self):
+        self.run_in_parallel(lambda: Favorite.objects.add(self.user.pk, self.product.pk))
+        self.assertEqual(Favorite.objects.count(), 1)
+
+
+class LedgerTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = create_user()
+
+    def place_order(self, promo_code=None):
+        self.shops = create_seller('909999991', 'Shop 1'), create_seller('909999992', 'Shop 2')
+        products = [product for shop in self.shops for product in create_products(2, seller=shop, images=0)]
+        cart_store.update_many(self.customer.pk, {product.pk: 2 for product in products})
+        return place_order(self.customer, promo_code, first_name='Ali', phone='901234567', payment_type='payme')
+
+    def balances(self):
+        settle()
+        return [UserBalance.objects.filter(user=shop.owner).values_list('balance', flat=True).first() or 0
+                for shop in self.shops]
+
+    def test_sellers_are_credited_once_the_order_is_delivered(self):
+        order = self.place_order()
+        self.assertEqual(self.balances(), [0, 0])
+
+        change_order_status(order.pk, Order.Status.DELIVERED)
+        change_order_status(order.pk, Order.Status.DELIVERED)
+        sold = [sum(item.price * item.quantity for item in order.order_items.filter(seller=shop))
+                for shop in self.shops]
+        self.assertEqual(self.balances(), sold)
+
+    def test_promo_code_is_split_between_the_sellers(self):
+        PromoCode.objects.create(code='HALF', discount=50)
+        order = self.place_order('HALF')
+        change_order_status(order.pk, Order.Status.DELIVERED)
+
+        balances = self.balances()
+        self.assertLessEqual(sum(balances), order.total_price)
+        self.assertGreaterEqual(sum(balances), order.total_price - len(self.shops))
+
+    def test_cancelling_a_delivered_order_takes_the_credits_back(self):
+        order = self.place_order()
+        change_order_status(order.pk, Order.Status.DELIVERED)
+        change_order_status(order.pk, Order.Status.CANCELLED)
+        self.assertEqual(self.balances(), [0, 0])
+        self.assertEqual(set(order.balance_transactions.values_list('type', flat=True)),
+                         {BalanceTransaction.Type.SALE, BalanceTransaction.Type.REFUND})
+
+        with self.assertRaises(ValidationError):
+            change_order_status(order.pk, Order.Status.DELIVERED)
+
+    def test_cancelling_an_undelivered_order_credits_nothing(self):
+        order = self.place_order()
+        change_order_status(order.pk, Order.Status.CANCELLED)
+        self.assertFalse(order.balance_transactions.exists())
+
+    def test_balances_from_before_the_ledger_survive_a_fix(self):
+        UserBalance.objects.create(user=self.customer, balance=700)
+        open_ledger_accounts(django_apps.get_app_config('apps'), using='default')
+        open_ledger_accounts(django_apps.get_app_config('apps'), using='default')
+
+        call_command('reconcile_balances', fix=True, stdout=StringIO())
+        self.assertEqual(UserBalance.objects.get(user=self.customer).balance, 700)
+        self.assertEqual(list(BalanceTransaction.objects.values_list('type', 'amount')),
+                         [(BalanceTransaction.Type.ADJUSTMENT, 700)])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ConvertImageTaskTest(TestCase):
+    def setUp(self):
+        self.product = create_products(1, images=0)[0]
+
+    def upload(self, content):
+        image = ProductImage(product=self.product, image=SimpleUploadedFile('photo.jpg', content))
+        image.save()
+        self.assertEqual(image.image_status, ProductImage.ImageStatus.PENDING)
+        return image
+
+    def test_converts_to_webp(self):
+        buffer = BytesIO()
+        Image.new('RGB', (4, 4)).save(buffer, format='JPEG')
+        image = self.upload(buffer.getvalue())
+
+        convert_image_to_webp.apply(args=[ProductImage._meta.label, image.pk])
+        image.refresh_from_db()
+        self.assertEqual(image.image_status, ProductImage.ImageStatus.READY)
+        self.assertTrue(image.image.name.endswith('.webp'))
+
+    def test_undecodable_file_fails(self):
+        image = self.upload(b'not an image')
+        with self.assertLogs('django', 'ERROR'):
+            convert_image_to_webp.apply(args=[ProductImage._meta.label, image.pk])
+        image.refresh_from_db()
+        self.assertEqual(image.image_status, ProductImage.ImageStatus.FAILED)
+
+    def test_storage_error_fails_once_retries_are_exhausted(self):
+        image = self.upload(b'not an image')
+        with (mock.patch.object(ProductImage, 'convert_img_to_webp', side_effect=OSError('disk')) as convert,
+              self.assertLogs('django', 'ERROR')):
+            convert_image_to_webp.apply(args=[ProductImage._meta.label, image.pk])
+        image.refresh_from_db()
+        self.assertEqual(image.image_status, ProductImage.ImageStatus.FAILED)
+        self.assertEqual(convert.call_count, convert_image_to_webp.max_retries + 1)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ProductImportTest(APITestCase):
+    url = '/api/v1/products/imports/'
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Phones')
+        self.user = create_user()
+        self.seller = Seller.objects.create(name='Mine', owner=self.user, address='Tashkent')
+        self.other = create_seller()
+        self.client.force_authenticate(self.user)
+
+    def run_import(self, rows, **data):
+        content = ''.join(json.dumps({'category': self.category.pk, 'price': 100, **row}) + '\n' for row in rows)
+        file = SimpleUploadedFile('products.jsonl', content.encode())
+        response = self.client.post(self.url, {'file': file, **data}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        import_products.apply(args=[response.data['id']])
+        return ProductImport.objects.get(pk=response.data['id'])
+
+    def test_rows_go_to_the_job_seller(self):
+        job = self.run_import([{'name': 'A', 'seller': self.other.pk}, {'name': 'B'}], seller=self.seller.pk)
+        self.assertEqual(job.created_rows, 2)
+        self.assertEqual(set(Product.objects.values_list('seller_id', flat=True)), {self.seller.pk})
+
+    def test_rows_can_not_name_a_seller_of_another_user(self):
+        job = self.run_import([{'name': 'A', 'seller': self.other.pk}, {'name': 'B', 'seller': self.seller.pk}])
+        self.assertEqual((job.created_rows, job.error_count), (1, 1))
+        self.assertFalse(Product.objects.filter(seller=self.other).exists())
+
+    def test_discounts_are_capped_at_100_percent(self):
+        job = self.run_import([{'name': 'A', 'discount': 101}, {'name': 'B', 'discount': 100}], seller=self.seller.pk)
+        self.assertEqual((job.created_rows, job.error_count), (1, 1))
+
+        serializer = ProductCreateModelSerializer(
+            data={'name': 'C', 'price': 100, 'discount': 101, 'category': self.category.pk})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('discount', serializer.errors)
+        self.assertEqual(discounted_price(100, 150), 0)
+
+
+class PhoneFilterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        phone_filter.rebuild([])
+
+    def test_new_and_changed_phones_are_added(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            user = create_user('901111111')
+        self.assertTrue(phone_filter.might_contain('901111111'))
+        self.assertFalse(phone_filter.might_contain('902222222'))
+
+        user.phone = '902222222'
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertTrue(phone_filter.might_contain('902222222'))
+
+    def test_saves_do_not_build_a_missing_filter(self):
+        existing = create_user('901111111')
+        get_redis().delete(phone_filter.key)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_user('902222222')
+
+        self.assertFalse(get_redis().exists(phone_filter.key))
+        self.assertTrue(phone_filter.might_contain(existing.phone))
+        response = self.client.get(f'/api/v1/auth/user-exists/{existing.phone}')
+        self.assertTrue(response.json()['data']['is_exists'])
+
+
+class ThrottleTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_forged_forwarded_for_shares_the_client_bucket(self):
+        user = create_user()
+        url = f'/api/v1/auth/user-exists/{user.phone}'
+        capacity = int(api_settings.DEFAULT_THROTTLE_RATES['user_exists'].split('/')[0])
+
+        # nginx appends the address it saw, everything before it comes from the client
+        statuses = [self.client.get(url, HTTP_X_FORWARDED_FOR=f'10.0.0.{i}, 198.51.100.7').status_code
+                    for i in range(capacity + 1)]
+        self.assertEqual(statuses, [200] * capacity + [429])
+
+
+class OTPRateLimitTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    @mock.patch.object(UserCheckPhoneAPIView, 'throttle_classes', ())
+    def test_forged_forwarded_for_does_not_reset_the_ip_limit(self):
+        limit = IP_SEND_RATE[0]
+        statuses = [
+            self.client.get(f'/api/v1/auth/user-exists/{901_000_000 + i}',
+                            HTTP_X_FORWARDED_FOR=f'10.0.0.{i}, 198.51.100.7').status_code
+            for i in range(limit + 1)
+        ]
+        self.assertEqual(statuses, [200] * limit + [429])
+
+
+class RejectingSMSProvider(FakeSMSProvider):
+    async def send_batch(self, client, messages):
+        self.calls = getattr(self, 'calls', 0) + 1
+        raise SMSRejectedError('400: invalid number')
+
+
+class SMSOutboxTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(SMS_PROVIDER_URL='https://sms.example.com/send', SMS_PROVIDER_TOKEN='token')
+    def test_provider_client_errors_are_rejections(self):
+        def handler(request):
+            return httpx.Response(400, json={'error': 'invalid number'})
+
+        async def send():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                await HTTPSMSProvider().send_batch(client, [SMSMessage('901234567', 'hi')])
+
+        with self.assertRaises(SMSRejectedError):
+            asyncio.run(send())
+
+    def test_rejected_batch_is_dead_lettered_without_retries(self):
+        queue_sms('901234567', 'hi')
+        provider = RejectingSMSProvider()
+        with self.assertLogs('django', 'WARNING'):
+            handled = flush_outbox(SMSDispatcher(provider))
+
+        redis = get_redis()
+        self.assertEqual((handled, provider.calls), (1, 1))
+        self.assertEqual(redis.llen(DEAD_LETTER_KEY), 1)
+        self.assertEqual(redis.llen(OUTBOX_KEY) + redis.llen(PROCESSING_KEY), 0)
+
+    def test_batch_left_by_a_crashed_flush_is_sent_first(self):
+        queue_sms('901234567', 'first')
+        queue_sms('901234568', 'second')
+        claim_batch(get_redis(), 1)  # a flush died after claiming the first message
+
+        provider = FakeSMSProvider()
+        with self.assertLogs('django', 'INFO'):
+            self.assertEqual(flush_outbox(SMSDispatcher(provider)), 2)
+        self.assertEqual([message.text for message in provider.sent], ['first', 'second'])
+        self.assertEqual(get_redis().llen(PROCESSING_KEY), 0)
+
+
+class DatabasePoolBudgetTest(SimpleTestCase):
+    env = {'DB_MAX_CONNECTIONS': '100', 'WEB_CONCURRENCY': '8', 'CELERY_WORKER_CONCURRENCY': '9'}
+
+    def load_settings(self, program, **env):
+        """The settings module as `program` would load it; a None in `env` unsets that variable."""
+        env = {'DB_POOL_MAX_SIZE': None, **self.env, **env}
+        with (mock.patch.object(sys, 'argv', [program, '-A', 'root']),
+              mock.patch.dict(os.environ, {name: value for name, value in env.items() if value is not None})):
+            for name in [name for name, value in env.items() if value is None]:
+                os.environ.pop(name, None)
+            spec = importlib.util.spec_from_file_location('budget_settings', root_settings.__file__)
+            settings = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(settings)
+            return vars(settings)
+
+    def test_celery_processes_count_against_the_connection_budget(self):
+        celery = self.load_settings('/app/.venv/bin/celery')
+        web = self.load_settings('/app/.venv/bin/gunicorn')
+
+        self.assertEqual(celery['DATABASES']['default']['OPTIONS']['pool']['max_size'], 1)
+        web_size = web['DATABASES']['default']['OPTIONS']['pool']['max_size']
+        # 9 children and beat at one connection each, the rest split between 8 web workers
+        self.assertEqual(web_size, 11)
+        self.assertLessEqual(8 * web_size + 10 * 1, 100)
+
+    def test_python_m_celery_is_a_celery_process(self):
+        settings = self.load_settings('/app/.venv/lib/python3.12/site-packages/celery/__main__.py')
+        self.assertTrue(settings['RUNNING_CELERY'])
+        self.assertEqual(settings['DATABASES']['default']['OPTIONS']['pool']['max_size'], 1)
+
+    def test_default_web_workers_are_capped_by_the_budget(self):
+        with mock.patch('multiprocessing.cpu_count', return_value=64):
+            settings = self.load_settings('/app/.venv/bin/gunicorn', WEB_CONCURRENCY=None)
+        web_size = settings['DATABASES']['default']['OPTIONS']['pool']['max_size']
+        self.assertEqual((settings['WEB_CONCURRENCY'], web_size), (90, 1))
+        self.assertLessEqual(90 * web_size + 10 * 1, 100)
+
+    def test_budget_too_small_for_the_web_workers_is_an_error(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.load_settings('/app/.venv/bin/gunicorn', WEB_CONCURRENCY='91')
+
+
+class HealthTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        # this process's monitor without its background thread, the tests refresh it by hand
+        self.enterContext(mock.patch.object(monitor, 'pid', os.getpid()))
+        self.enterContext(mock.patch.object(monitor, 'snapshot', None))
+
+    def test_probed_services_are_reported(self):
+        monitor.refresh()
+        response = self.client.get('/health/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['status'], 'ok')
+        self.assertEqual({name: result['status'] for name, result in data['services'].items()},
+                         {'database': 'ok', 'redis': 'ok'})
+        self.assertEqual(data['celery_queue_length'], 0)
+
+    def test_failed_or_stale_probes_are_unhealthy(self):
+        def fail():
+            raise ConnectionError
+
+        with mock.patch.dict(monitor.checks, redis=fail):
+            monitor.refresh()
+        response = self.client.get('/health/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['services']['redis']['status'], 'error')
+
+        monitor.refresh()
+        monitor.snapshot['checked_at'] -= monitor.ttl
+        self.assertEqual(self.client.get('/health/').json()['status'], 'error')
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_histograms_and_probes_render_as_prometheus_text(self):
+        for seconds in (0.03, 0.2):
+            latency_histograms.observe('test"view', 'GET', 201, seconds)
+        latency_histograms.flush()
+        snapshot = {
+            'services': {'database': {'status': 'ok', 'latency_ms': 1.5},
+                         'redis': {'status': 'error', 'latency_ms': 2}},
+            'celery_queue': 'celery', 'celery_queue_length': 3,
+        }
+        lines = render_metrics(snapshot).splitlines()
+
+        labels = 'view="test\\"view",method="GET",status="2xx"'
+        for line in (f'http_request_duration_seconds_bucket{{{labels},le="0.025"}} 0',
+                     f'http_request_duration_seconds_bucket{{{labels},le="0.05"}} 1',
+                     f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2',
+                     f'http_request_duration_seconds_count{{{labels}}} 2',
+                     'service_up{service="database"} 1',
+                     'service_up{service="redis"} 0',
+                     'service_probe_seconds{service="database"} 0.0015',
+                     'celery_queue_length{queue="celery"} 3'):
+            self.assertIn(line, lines)
+        total = next(line for line in lines if line.startswith(f'http_request_duration_seconds_sum{{{labels}}}'))
+        self.assertAlmostEqual(float(total.rsplit(' ', 1)[1]), 0.23)
+
+    def test_missing_snapshot_renders_no_probes(self):
+        text = render_metrics(None)
+        self.assertTrue(text.endswith('\n'))
+        self.assertNotIn('service_up{', text)
+        self.assertNotIn('celery_queue_length{', text)
@@ -0,0 +1,98 @@
+from functools import lru_cache
+
+from redis import RedisError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from apps.utils import get_redis, logger
+
+# KEYS[1] bucket hash; ARGV[1] capacity, ARGV[2] refill rate in tokens per second.
+# Returns {allowed, seconds until the next token}. The hash holds two fields, whatever the traffic.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed, wait = 0, 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+
+@lru_cache(maxsize=None)
+def token_bucket_script():
+    return get_redis().register_script(TOKEN_BUCKET_SCRIPT)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Scoped throttle backed by an atomic token bucket in Redis.
+
+    Uses the view's `throttle_scope` and the matching rate from
+    DEFAULT_THROTTLE_RATES ('10/min' is a bucket of 10 that refills at
+    10 tokens a minute). Authenticated users are keyed by id, anonymous
+    clients by IP.
+    """
+    scope_attr = 'throttle_scope'
+    key_format = 'throttle:%(scope)s:%(ident)s'
+    durations = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def parse_rate(self, rate):
+        num, period = rate.split('/')
+        capacity = int(num)
+        return capacity, capacity / self.durations[period[0]]
+
+    def get_cache_key(self, request, view):
+        scope = getattr(view, self.scope_attr, None)
+        if scope is None:
+            return None
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = self.get_ident(request)
+        return self.key_format % {'scope': scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        capacity, rate = self.parse_rate(api_settings.DEFAULT_THROTTLE_RATES[getattr(view, self.scope_attr)])
+        try:
+            allowed, wait = token_bucket_script()(keys=[key], args=[capacity, rate])
+        except RedisError:
+            logger.warning(f"throttle {key} skipped, Redis is unavailable", exc_info=True)
+            return True
+
+        self.wait_seconds = float(wait)
+        return bool(allowed)
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class WriteTokenBucketThrottle(TokenBucketThrottle):
+    """Only spends tokens on unsafe methods, reads are never throttled."""
+
+    def allow_request(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        return super().allow_request(request, view)
@@ -10,15 +10,25 @@ from apps.views import RegionListAPIView, DistrictListAPIView, CategoryListCreat
     UserRegisterCreateAPIView, UserChangePasswordUpdateAPIView, UserProfileUpdateAPIView, CartItemListAPIView, \
     CategoryRetrieveUpdateDestroyAPIView, \
     CustomTokenRefreshView, CartItemUpdateDestroyAPIView, FavoriteListAPIView, FavoriteDestroyAPIView, \
-    AddressListAPIView, AddressUpdateDestroyAPIView, ProductImageCreateAPIView
+    AddressListAPIView, AddressUpdateDestroyAPIView, ProductImageCreateAPIView, CategoryTreeAPIView, \
+    ProductImportCreateAPIView, ProductImportRetrieveAPIView, CheckoutCreateAPIView, OrderListAPIView, \
+    SellerOrderListAPIView, SellerDailySalesListAPIView, ProductSalesListAPIView, CategorySalesListAPIView, \
+    BalanceTransactionListAPIView, CartItemBulkAPIView, FavoriteBulkAPIView, DatabasePoolStatsAPIView
 
 urlpatterns = [
     path('regions/', RegionListAPIView.as_view()),
     path('districts/', DistrictListAPIView.as_view()),
     path('categories/', CategoryListCreateAPIView.as_view()),
+    path('categories/tree/', CategoryTreeAPIView.as_view()),
     path('sellers/', SellerCreateAPIView.as_view()),
+    path('sellers/orders/', SellerOrderListAPIView.as_view(), name='seller_orders'),
+    path('sellers/analytics/daily/', SellerDailySalesListAPIView.as_view(), name='seller_daily_sales'),
+    path('sellers/analytics/products/', ProductSalesListAPIView.as_view(), name='seller_product_sales'),
+    path('sellers/analytics/categories/', CategorySalesListAPIView.as_view(), name='seller_category_sales'),
     path('products/', ProductListCreateAPIView.as_view()),
     path('products/images/', ProductImageCreateAPIView.as_view()),
+    path('products/imports/', ProductImportCreateAPIView.as_view()),
+    path('products/imports/<int:pk>/', ProductImportRetrieveAPIView.as_view()),
     path('categories/<int:pk>/', CategoryRetrieveUpdateDestroyAPIView.as_view()),
     # path('products/<int:pk>/', ProductRetrieveUpdateDestroyAPIView.as_view()),
     #
@@ -32,14 +42,21 @@ urlpatterns = [
     path('users/update/', UserProfileUpdateAPIView.as_view(), name='users_profile_update'),
     path('users/carts/', CartItemListAPIView.as_view(), name='cart-item-list'),
     path('users/carts/<int:pk>', CartItemUpdateDestroyAPIView.as_view(), name='cart_item_update'),
+    path('users/carts/bulk/', CartItemBulkAPIView.as_view(), name='cart_item_bulk'),
     path('users/favorites/', FavoriteListAPIView.as_view(), name='favorites_list'),
     path('users/favorites/<int:pk>', FavoriteDestroyAPIView.as_view(), name='favorites_destroy'),
+    path('users/favorites/bulk/', FavoriteBulkAPIView.as_view(), name='favorites_bulk'),
     path('users/address/', AddressListAPIView.as_view(), name='address_list'),
     path('users/address/<int:pk>', AddressUpdateDestroyAPIView.as_view(), name='address_update'),
+    path('users/checkout/', CheckoutCreateAPIView.as_view(), name='checkout'),
+    path('users/orders/', OrderListAPIView.as_view(), name='orders_list'),
+    path('users/balance/transactions/', BalanceTransactionListAPIView.as_view(), name='balance_transactions'),
 
     path('auth/register/', UserRegisterCreateAPIView.as_view(), name='users_register'),
     path('auth/token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/refresh-token/', CustomTokenRefreshView.as_view(), name='token_refresh'),
     path('auth/user-exists/<int:phone>', UserCheckPhoneAPIView.as_view(), name='users_check_phone'),
 
+    path('internal/db-pool/', DatabasePoolStatsAPIView.as_view(), name='db_pool_stats'),
+
 ]
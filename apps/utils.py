@@ -1,4 +1,54 @@
 import logging
+import os
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
 
 logging.basicConfig()
-logger = logging.getLogger('django')
\ No newline at end of file
+logger = logging.getLogger('django')
+
+
+def etag_response(request, data, etag):
+    headers = {'ETag': etag, 'Cache-Control': 'public, no-cache'}
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(data, headers=headers)
+
+
+@lru_cache(maxsize=None)
+def get_redis():
+    """Process-wide Redis client; its connection pool is shared by every caller."""
+    return redis.Redis.from_url(settings.REDIS_URL)
+
+
+def database_pool_stats(alias=DEFAULT_DB_ALIAS):
+    """Connection pool counters of this process, None when pooling is off."""
+    pool = connections[alias].pool
+    if pool is None:
+        return None
+
+    stats = pool.get_stats()
+    # the pool opens on this process's first query, until then it holds no connections
+    size = stats.get('pool_size', 0) if not pool.closed else 0
+    return {
+        'pid': os.getpid(),
+        'open': not pool.closed,
+        'min_size': stats.get('pool_min', 0),
+        'max_size': stats.get('pool_max', 0),
+        'size': size,
+        'idle': stats.get('pool_available', 0),
+        'in_use': size - stats.get('pool_available', 0),
+        'waiting': stats.get('requests_waiting', 0),
+        'requests': stats.get('requests_num', 0),
+        'queued': stats.get('requests_queued', 0),
+        'wait_ms': stats.get('requests_wait_ms', 0),
+        'timeouts': stats.get('requests_errors', 0),
+        'connection_errors': stats.get('connections_errors', 0),
+        'connections_lost': stats.get('connections_lost', 0),
+    }
@@ -1,29 +1,46 @@
+from datetime import timedelta
 from math import prod
 from random import randint
 
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils.timezone import localdate
 from django_filters.rest_framework import DjangoFilterBackend
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import status
+from rest_framework.exceptions import ValidationError, NotFound
 from rest_framework.authentication import TokenAuthentication
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView, ListAPIView, CreateAPIView, \
     GenericAPIView, RetrieveAPIView, UpdateAPIView, DestroyAPIView
 from rest_framework.pagination import LimitOffsetPagination, CursorPagination
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, IsAdminUser
 from rest_framework.response import Response
-from rest_framework.throttling import AnonRateThrottle
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from apps.models import Region, District, Category, User, Seller, Product, CartItem, Cart, Favorite, Address, \
-    ProductImage
+from apps.models import Region, District, Category, User, Seller, Product, CartItem, Favorite, Address, \
+    ProductImage, ProductImport, Order, OrderItem, SellerDailySales, ProductDailySales, CategoryDailySales, \
+    BalanceTransaction
 #
 # from apps.filters import UserFilterSet, OrderFilterSet
 # from apps.models import Category, Product, User, Order
 # from apps.paginations import CustomPageNumberPagination, CustomCursorPagination
+from apps.bloom import phone_filter
+from apps.asyncviews import AsyncAPIViewMixin
+from apps.caches import aget_category_tree, reference_data, aget_product_facets
+from apps.carts import cart_store, cart_items
+from apps.filters import FullTextSearchFilter, ProductFilterSet, OrderFilterSet, SellerOrderFilterSet, \
+    SalesRollupFilterSet
+from apps.otp import issue_code
+from apps.paginations import KeysetPagination, SellerOrderPagination
 from apps.serializers import RegionModelSerializer, \
     DistrictModelSerializer, \
     CategoryModelSerializer, \
+    CategoryTreeModelSerializer, \
     CustomTokenObtainPairSerializer, \
     UserModelSerializer, \
     SellerModelSerializer, \
@@ -31,34 +48,56 @@ from apps.serializers import RegionModelSerializer, \
     ProductCreateModelSerializer, \
     UserChangePasswordModelSerializer, \
     UserProfileUpdateModelSerializer, UserRegisterModelSerializer, CartItemModelSerializer, \
-    FavoriteModelSerializer, AddressModelSerializer, ProductImageSerializer, ProductImageCreateSerializer
+    FavoriteModelSerializer, AddressModelSerializer, ProductImageSerializer, ProductImageCreateSerializer, \
+    ProductImportModelSerializer, CheckoutModelSerializer, OrderListModelSerializer, SellerDailySalesModelSerializer, \
+    SalesSummarySerializer, BalanceTransactionModelSerializer, CartBulkSerializer, FavoriteBulkSerializer
 # CategoryModelSerializer, ProductListModelSerializer, UserModelSerializer,
 
-from apps.tasks import send_sms_code, register_sms
+from apps.tasks import send_sms_code, import_products
+from apps.throttling import TokenBucketThrottle, WriteTokenBucketThrottle
+from apps.utils import etag_response, database_pool_stats
 
 
 @extend_schema(tags=['regions'])
-class RegionListAPIView(ListAPIView):
+class RegionListAPIView(AsyncAPIViewMixin, ListAPIView):
     queryset = Region.objects.all()
     serializer_class = RegionModelSerializer
     pagination_class = None
 
+    async def get(self, request, *args, **kwargs):
+        data, etag = await reference_data.aregions()
+        return etag_response(request, data, etag)
+
 
 @extend_schema(tags=['regions'])
-class DistrictListAPIView(ListAPIView):
+class DistrictListAPIView(AsyncAPIViewMixin, ListAPIView):
     queryset = District.objects.all()
     serializer_class = DistrictModelSerializer
     filter_backends = DjangoFilterBackend,
     filterset_fields = 'region_id',
     pagination_class = None
 
+    async def get(self, request, *args, **kwargs):
+        region_id = request.query_params.get('region_id') or None
+        if region_id is not None:
+            try:
+                region_id = int(region_id)
+            except ValueError:
+                raise ValidationError({'region_id': ['Enter a number.']})
+        data, etag = await reference_data.adistricts(region_id)
+        return etag_response(request, data, etag)
+
 
 @extend_schema(tags=['auth'])
 class UserCheckPhoneAPIView(APIView):
+    throttle_classes = TokenBucketThrottle,
+    throttle_scope = 'user_exists'
+
     def get(self, request, phone):
-        is_exists = User.objects.filter(phone=phone).exists()
+        # a negative from the Bloom filter is definite, only possible positives reach Postgres
+        is_exists = phone_filter.might_contain(phone) and User.objects.filter(phone=phone).exists()
         if not is_exists:
-            register_sms.delay(phone)
+            issue_code(phone, BaseThrottle().get_ident(request))
 
         return Response({'data': {'is_exists': is_exists}})
 
@@ -67,10 +106,12 @@ class UserCheckPhoneAPIView(APIView):
 class UserRegisterCreateAPIView(CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserRegisterModelSerializer
+    throttle_classes = TokenBucketThrottle,
+    throttle_scope = 'register'
 
 
 @extend_schema(tags=['users'])
-class UserGetMeRetrieveAPIView(RetrieveAPIView):
+class UserGetMeRetrieveAPIView(AsyncAPIViewMixin, RetrieveAPIView):
     queryset = User.objects.all()
     serializer_class = UserModelSerializer
     permission_classes = IsAuthenticated,
@@ -78,6 +119,9 @@ class UserGetMeRetrieveAPIView(RetrieveAPIView):
     def get_object(self):
         return self.request.user
 
+    async def get(self, request, *args, **kwargs):
+        return Response(self.get_serializer(self.get_object()).data)
+
 
 @extend_schema(tags=['users'])
 class UserProfileUpdateAPIView(UpdateAPIView):
@@ -106,31 +150,46 @@ class UserChangePasswordUpdateAPIView(UpdateAPIView):
 
 @extend_schema(tags=['users'])
 class CartItemListAPIView(ListCreateAPIView):
-    queryset = CartItem.objects.select_related('product', 'product__seller')
+    """The cart is read from and written to the Redis cart store, Postgres is updated in the background."""
+    queryset = CartItem.objects.all()
     serializer_class = CartItemModelSerializer
     pagination_class = None
     permission_classes = IsAuthenticated,
+    throttle_classes = WriteTokenBucketThrottle,
+    throttle_scope = 'cart'
 
-    def get_queryset(self):
-        qs = super().get_queryset()
-        return qs.filter(cart__user=self.request.user)
+    def list(self, request, *args, **kwargs):
+        user_id = request.user.pk
+        items = cart_items(user_id, cart_store.items(user_id))
+        return Response(self.get_serializer(items, many=True).data)
 
     def perform_create(self, serializer):
-        user = self.request.user
-        cart, created = Cart.objects.get_or_create(user=user)
-        serializer.save(cart=cart)
+        serializer.save(user_id=self.request.user.pk)
 
 
 @extend_schema(tags=['users'])
 class CartItemUpdateDestroyAPIView(UpdateAPIView, DestroyAPIView):
+    """Cart items are addressed by product id."""
     queryset = CartItem.objects.all()
     serializer_class = CartItemModelSerializer
     permission_classes = IsAuthenticated,
+    throttle_classes = WriteTokenBucketThrottle,
+    throttle_scope = 'cart'
     http_method_names = ['patch', 'delete']
 
-    def get_queryset(self):
-        qs = super().get_queryset()
-        return qs.filter(cart__user=self.request.user)
+    def get_object(self):
+        user_id, product_id = self.request.user.pk, self.kwargs['pk']
+        quantity = cart_store.items(user_id).get(product_id)
+        items = cart_items(user_id, {product_id: quantity}) if quantity else []
+        if not items:
+            raise NotFound
+        return items[0]
+
+    def perform_update(self, serializer):
+        serializer.save(user_id=self.request.user.pk)
+
+    def perform_destroy(self, instance):
+        cart_store.remove(self.request.user.pk, instance.product_id)
 
 
 @extend_schema(tags=['users'])
@@ -179,7 +238,7 @@ class AddressUpdateDestroyAPIView(UpdateAPIView, DestroyAPIView):
 
 @extend_schema(tags=['users'])
 class FavoriteListAPIView(ListCreateAPIView):
-    queryset = Favorite.objects.all()
+    queryset = Favorite.objects.for_listing().order_by('-id')
     serializer_class = FavoriteModelSerializer
     permission_classes = IsAuthenticated,
 
@@ -199,6 +258,42 @@ class FavoriteDestroyAPIView(DestroyAPIView):
         return qs.filter(user=self.request.user)
 
 
+@extend_schema(tags=['users'], request=CartBulkSerializer, responses=CartItemModelSerializer(many=True))
+class CartItemBulkAPIView(GenericAPIView):
+    """Apply a whole list of cart changes in one request, returns the updated cart."""
+    serializer_class = CartBulkSerializer
+    permission_classes = IsAuthenticated,
+    throttle_classes = WriteTokenBucketThrottle,
+    throttle_scope = 'cart'
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(request.user.pk)
+
+        user_id = request.user.pk
+        items = cart_items(user_id, cart_store.items(user_id))
+        return Response(CartItemModelSerializer(items, many=True, context=self.get_serializer_context()).data)
+
+
+@extend_schema(tags=['users'], request=FavoriteBulkSerializer, responses=FavoriteModelSerializer(many=True))
+class FavoriteBulkAPIView(GenericAPIView):
+    """Add many favorites in one INSERT, returns them as the favorites list renders them."""
+    serializer_class = FavoriteBulkSerializer
+    permission_classes = IsAuthenticated,
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(request.user.pk)
+
+        favorites = (Favorite.objects.for_listing()
+                     .filter(user=request.user, product_id__in=serializer.validated_data['products'])
+                     .order_by('-id'))
+        data = FavoriteModelSerializer(favorites, many=True, context=self.get_serializer_context()).data
+        return Response(data)
+
+
 # class RegisterAPIView(CreateAPIView):
 #     queryset = User.objects.all()
 #     serializer_class = RegisterModelSerializer
@@ -216,15 +311,133 @@ class CategoryListCreateAPIView(ListCreateAPIView):
     permission_classes = IsAuthenticatedOrReadOnly,
 
 
+@extend_schema(tags=['products'], responses=CategoryTreeModelSerializer(many=True))
+class CategoryTreeAPIView(AsyncAPIViewMixin, APIView):
+    async def get(self, request):
+        return Response(await aget_category_tree())
+
+
 class SellerCreateAPIView(CreateAPIView):
     queryset = Seller.objects.all()
     serializer_class = SellerModelSerializer
     permission_classes = IsAuthenticated,
 
 
+@extend_schema(tags=['orders'])
+class CheckoutCreateAPIView(CreateAPIView):
+    queryset = Order.objects.all()
+    serializer_class = CheckoutModelSerializer
+    permission_classes = IsAuthenticated,
+
+
+@extend_schema(tags=['orders'])
+class OrderListAPIView(ListAPIView):
+    queryset = Order.objects.order_by('-created_at', '-id')
+    serializer_class = OrderListModelSerializer
+    permission_classes = IsAuthenticated,
+    filter_backends = DjangoFilterBackend,
+    filterset_class = OrderFilterSet
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        qs = super().get_queryset().filter(user=self.request.user)
+        return self.get_serializer().setup_eager_loading(qs)
+
+
+@extend_schema(tags=['orders'])
+class SellerOrderListAPIView(OrderListAPIView):
+    """
+    Orders with items of the current user's shops, only those items are listed.
+
+    A page is read from the (seller, ordered_at, order) index of the items,
+    newest first, and only the orders of that page are loaded.
+    """
+    queryset = OrderItem.objects.all()
+    filterset_class = SellerOrderFilterSet
+    pagination_class = SellerOrderPagination
+
+    def get_queryset(self):
+        # a literal id list, a single shop becomes `seller_id = x` and the index is walked in order
+        seller_ids = list(Seller.objects.filter(owner=self.request.user).values_list('id', flat=True))
+        return (OrderItem.objects.filter(seller_id__in=seller_ids)
+                .order_by('-ordered_at', '-order_id').distinct('ordered_at', 'order_id')
+                .only('ordered_at', 'order_id'))
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        items = OrderItem.objects.filter(seller__owner=self.request.user)
+        orders = self.get_serializer().setup_eager_loading(Order.objects.all(), items)
+        orders = orders.in_bulk([item.order_id for item in page])
+        return [orders[item.order_id] for item in page]
+
+
+@extend_schema(tags=['users'])
+class BalanceTransactionListAPIView(ListAPIView):
+    queryset = BalanceTransaction.objects.order_by('-id')
+    serializer_class = BalanceTransactionModelSerializer
+    permission_classes = IsAuthenticated,
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        return qs.filter(user=self.request.user)
+
+
+@extend_schema(tags=['analytics'])
+class SellerDailySalesListAPIView(ListAPIView):
+    """Daily totals of the current user's shops, read from the rollup table."""
+    queryset = SellerDailySales.objects.order_by('date', 'seller_id')
+    serializer_class = SellerDailySalesModelSerializer
+    permission_classes = IsAuthenticated,
+    filter_backends = DjangoFilterBackend,
+    filterset_class = SalesRollupFilterSet
+    pagination_class = None
+    default_days = 30
+
+    def get_queryset(self):
+        qs = super().get_queryset().filter(seller__owner=self.request.user)
+        if 'date_from' not in self.request.query_params:
+            qs = qs.filter(date__gte=localdate() - timedelta(days=self.default_days))
+        return qs
+
+
+@extend_schema(tags=['analytics'])
+class ProductSalesListAPIView(SellerDailySalesListAPIView):
+    """Best selling products over the period, summed from the daily product rollup."""
+    queryset = ProductDailySales.objects.all()
+    serializer_class = SalesSummarySerializer
+    pagination_class = api_settings.DEFAULT_PAGINATION_CLASS
+    group_by = 'product_id', 'product__name'
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        id_field, name_field = self.group_by
+        return (queryset.values(item_id=F(id_field), name=F(name_field))
+                .annotate(total_revenue=Sum('revenue'), total_quantity=Sum('quantity'),
+                          total_orders=Sum('order_count'))
+                .order_by('-total_revenue', 'item_id'))
+
+
+@extend_schema(tags=['analytics'])
+class CategorySalesListAPIView(ProductSalesListAPIView):
+    """Sales per category over the period, summed from the daily category rollup."""
+    queryset = CategoryDailySales.objects.all()
+    group_by = 'category_id', 'category__name'
+
+
+@extend_schema(tags=['internal'])
+class DatabasePoolStatsAPIView(APIView):
+    """Pool counters of the worker process that serves the request."""
+    permission_classes = IsAdminUser,
+
+    def get(self, request):
+        return Response(database_pool_stats())
+
+
 @extend_schema(tags=['auth'])
 class CustomTokenObtainPairView(TokenObtainPairView):
-    pass
+    throttle_classes = TokenBucketThrottle,
+    throttle_scope = 'auth'
     # serializer_class = CustomTokenObtainPairSerializer
 
 
@@ -246,16 +459,68 @@ class ProductImageCreateAPIView(CreateAPIView):
 
 
 @extend_schema(tags=['products'])
-class ProductListCreateAPIView(ListCreateAPIView):
-    queryset = Product.objects.order_by('id')
+class ProductImportCreateAPIView(CreateAPIView):
+    queryset = ProductImport.objects.all()
+    serializer_class = ProductImportModelSerializer
+    permission_classes = IsAuthenticated,
+
+    def perform_create(self, serializer):
+        job = serializer.save()
+        transaction.on_commit(lambda: import_products.delay(job.id))
+
+
+@extend_schema(tags=['products'])
+class ProductImportRetrieveAPIView(RetrieveAPIView):
+    queryset = ProductImport.objects.all()
+    serializer_class = ProductImportModelSerializer
+    permission_classes = IsAuthenticated,
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        return qs.filter(user=self.request.user)
+
+
+@extend_schema(tags=['products'])
+class ProductListCreateAPIView(AsyncAPIViewMixin, ListCreateAPIView):
+    queryset = Product.objects.defer('search_vector').order_by('id')
     serializer_class = ProductListModelSerializer
-    filter_backends = DjangoFilterBackend, OrderingFilter, SearchFilter
-    filterset_fields = ['category_id']
+    filter_backends = DjangoFilterBackend, FullTextSearchFilter, OrderingFilter
+    filterset_class = ProductFilterSet
+    pagination_class = KeysetPagination
+    ordering_fields = 'id', 'price', 'created_at'
+    # facets are a GROUPING SETS aggregate over the filtered catalog; only listings that show them ask
+    facets_query_param = 'facets'
+    # only these views are popular enough to share cached facets
+    cached_facet_params = {'category'}
+
+    @extend_schema(parameters=[OpenApiParameter('facets', bool, description='add category, seller and price counts')])
+    async def get(self, request, *args, **kwargs):
+        # the category filter looks up the category row, so filtering runs off the event loop
+        queryset = await sync_to_async(self.filter_queryset)(self.get_queryset())
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        if request.query_params.get(self.facets_query_param) in {'1', 'true'}:
+            response.data['facets'] = await aget_product_facets(queryset, self.get_facets_cache_key())
+        return response
+
+    async def post(self, request, *args, **kwargs):
+        return await sync_to_async(self.create)(request, *args, **kwargs)
+
+    def get_facets_cache_key(self):
+        params = self.request.query_params
+        ignored = {self.paginator.cursor_query_param, self.paginator.page_size_query_param,
+                   OrderingFilter.ordering_param, self.facets_query_param}
+        filters = {key: params[key] for key in params if key not in ignored}
+        if not set(filters) <= self.cached_facet_params:
+            return None
+        return f"product:facets:{filters.get('category', 'all')}"
 
-    # filterset_class = ProductFilterSet
-    # pagination_class = CustomCursorPagination
-    # search_fields = ("name", "category__name")
-    # ordering_fields = 'price', 'id'
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.request.method == 'GET':
+            qs = self.get_serializer().setup_eager_loading(qs)
+        return qs
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
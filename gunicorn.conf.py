@@ -0,0 +1,19 @@
+import os
+
+from root.settings import WEB_CONCURRENCY
+
+# SERVER_MODE=asgi (default) serves root.asgi with uvicorn workers, SERVER_MODE=wsgi keeps the classic sync workers
+SERVER_MODE = os.getenv('SERVER_MODE', 'asgi')
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+# capped by the database connection budget, see root/settings.py
+workers = WEB_CONCURRENCY
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+
+if SERVER_MODE == 'wsgi':
+    wsgi_app = 'root.wsgi:application'
+    worker_class = 'sync'
+else:
+    wsgi_app = 'root.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
@@ -1,31 +1,120 @@
+import os
+import threading
+from time import perf_counter, sleep, time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.http import JsonResponse
 from django.db import connection
-import redis
 
-from root.settings import CELERY_BROKER_URL
+from apps.utils import get_redis, logger, database_pool_stats
+from root.metrics import latency_histograms
 
 
-def health(request):
-    status = {
-        "database": "ok",
-        "redis": "ok"
-    }
+def check_database():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
 
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1")
-    except Exception:
-        status["database"] = "error"
 
+def check_redis():
+    get_redis().ping()
+
+
+def probe(check):
+    start = perf_counter()
     try:
-        r = redis.Redis.from_url(CELERY_BROKER_URL)
-        r.ping()
+        check()
+        status = "ok"
     except Exception:
-        status["redis"] = "error"
+        status = "error"
+    return {"status": status, "latency_ms": round((perf_counter() - start) * 1000, 2)}
+
+
+class HealthMonitor:
+    """
+    Probes the services from a background thread and keeps the last result in memory.
+
+    Every worker process starts its own thread on its first request, so a
+    health check only reads a dict. The same thread flushes the request
+    metrics. A snapshot older than `ttl` means the thread is stuck on a
+    probe and is reported as an error.
+    """
+    checks = {
+        "database": check_database,
+        "redis": check_redis,
+    }
+
+    def __init__(self, interval, ttl):
+        self.interval = interval
+        self.ttl = ttl
+        self.queue = getattr(settings, 'CELERY_TASK_DEFAULT_QUEUE', 'celery')
+        self.snapshot = None
+        self.ready = threading.Event()
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Start the refresher of this process; a forked worker starts its own."""
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.snapshot = None
+            self.ready = threading.Event()
+            threading.Thread(target=self.run, name='health-monitor', daemon=True).start()
+
+    def run(self):
+        while True:
+            try:
+                self.refresh()
+                latency_histograms.flush()
+            except Exception:
+                logger.exception("Health refresh failed")
+            finally:
+                connection.close()  # hands the connection back to the pool between probes
+            sleep(self.interval)
+
+    def refresh(self):
+        try:
+            queue_length = get_redis().llen(self.queue)
+        except Exception:
+            queue_length = None
+        self.snapshot = {
+            "services": {name: probe(check) for name, check in self.checks.items()},
+            "celery_queue": self.queue,
+            "celery_queue_length": queue_length,
+            "checked_at": time(),
+        }
+        self.ready.set()
+        return self.snapshot
+
+    def current(self):
+        """The last snapshot, waits for the first refresh of a fresh process; None if it outlasts the ttl."""
+        self.start()
+        self.ready.wait(self.ttl)
+        return self.snapshot
+
+    def is_healthy(self, snapshot):
+        return (snapshot is not None and time() - snapshot["checked_at"] < self.ttl
+                and all(result["status"] == "ok" for result in snapshot["services"].values()))
+
+
+monitor = HealthMonitor(interval=settings.HEALTH_CHECK_INTERVAL, ttl=settings.HEALTH_CHECK_TTL)
+
 
-    overall_status = "ok" if all(v == "ok" for v in status.values()) else "error"
+async def health(request):
+    snapshot = monitor.snapshot if monitor.pid == os.getpid() else None
+    if snapshot is None:
+        snapshot = await sync_to_async(monitor.current)()
+    healthy = monitor.is_healthy(snapshot)
+    snapshot = snapshot or {}
 
     return JsonResponse({
-        "status": overall_status,
-        "services": status
-    })
+        "status": "ok" if healthy else "error",
+        "services": snapshot.get("services", {}),
+        "checked_at": snapshot.get("checked_at"),
+        "celery_queue_length": snapshot.get("celery_queue_length"),
+        "database_pool": database_pool_stats(),
+    }, status=200 if healthy else 503)
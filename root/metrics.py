@@ -0,0 +1,174 @@
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import HttpResponse
+
+from apps.utils import get_redis, logger, database_pool_stats
+
+METRICS_KEY = 'metrics:http'
+# upper bounds in seconds, the last bucket is +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class LatencyHistograms:
+    """
+    Request latency histograms per (url name, method, status class).
+
+    Requests only bump counters in this process's memory; `flush`, called by
+    the health monitor's thread, adds them to one Redis hash that every
+    worker shares, so a scrape sees the whole deployment.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+
+    def observe(self, view, method, status, seconds):
+        labels = view, method, f'{status // 100}xx'
+        bucket = bisect_left(LATENCY_BUCKETS, seconds)
+        with self.lock:
+            buckets, total = self.pending.get(labels) or ([0] * (len(LATENCY_BUCKETS) + 1), 0.0)
+            buckets[bucket] += 1
+            self.pending[labels] = buckets, total + seconds
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+
+        pipe = get_redis().pipeline(transaction=False)
+        for labels, (buckets, total) in pending.items():
+            prefix = '|'.join(labels)
+            for bucket, count in enumerate(buckets):
+                if count:
+                    pipe.hincrby(METRICS_KEY, f'{prefix}|{bucket}', count)
+            pipe.hincrbyfloat(METRICS_KEY, f'{prefix}|sum', total)
+        try:
+            pipe.execute()
+        except Exception:
+            logger.exception("Request metrics could not be flushed")
+            with self.lock:
+                for labels, (buckets, total) in pending.items():
+                    current, current_total = self.pending.get(labels) or ([0] * len(buckets), 0.0)
+                    self.pending[labels] = [a + b for a, b in zip(current, buckets)], current_total + total
+
+    @staticmethod
+    def collect():
+        """`{labels: (bucket counts, sum)}` of every worker, as of their last flush."""
+        histograms = {}
+        for field, value in get_redis().hgetall(METRICS_KEY).items():
+            *labels, bucket = field.decode().split('|')
+            buckets, total = histograms.setdefault(tuple(labels), ([0] * (len(LATENCY_BUCKETS) + 1), [0.0]))
+            if bucket == 'sum':
+                total[0] = float(value)
+            else:
+                buckets[int(bucket)] = int(value)
+        return {labels: (buckets, total[0]) for labels, (buckets, total) in histograms.items()}
+
+
+latency_histograms = LatencyHistograms()
+
+
+def url_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.url_name or match.route
+
+
+class RequestMetricsMiddleware:
+    """Times every request into `latency_histograms`; keep it first in MIDDLEWARE."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        from root.health import monitor
+
+        self.get_response = get_response
+        self.monitor = monitor
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.monitor.start()
+        start = perf_counter()
+        response = self.get_response(request)
+        latency_histograms.observe(url_name(request), request.method, response.status_code, perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        self.monitor.start()
+        start = perf_counter()
+        response = await self.get_response(request)
+        latency_histograms.observe(url_name(request), request.method, response.status_code, perf_counter() - start)
+        return response
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def render_labels(**labels):
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def render_metrics(snapshot):
+    """Prometheus text exposition of the latency histograms and the health monitor's last snapshot."""
+    lines = [
+        '# HELP http_request_duration_seconds Request latency by URL name.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for (view, method, status), (buckets, total) in sorted(latency_histograms.collect().items()):
+        labels = dict(view=view, method=method, status=status)
+        cumulative = 0
+        for bound, count in zip((*LATENCY_BUCKETS, '+Inf'), buckets):
+            cumulative += count
+            lines.append(f'http_request_duration_seconds_bucket{render_labels(**labels, le=bound)} {cumulative}')
+        lines.append(f'http_request_duration_seconds_sum{render_labels(**labels)} {total}')
+        lines.append(f'http_request_duration_seconds_count{render_labels(**labels)} {cumulative}')
+
+    snapshot = snapshot or {'services': {}, 'celery_queue_length': None}
+    lines += [
+        '# HELP service_up Whether the last background probe of a service succeeded.',
+        '# TYPE service_up gauge',
+    ]
+    for service, result in snapshot['services'].items():
+        lines.append(f'service_up{render_labels(service=service)} {int(result["status"] == "ok")}')
+    lines += [
+        '# HELP service_probe_seconds Duration of the last background probe of a service.',
+        '# TYPE service_probe_seconds gauge',
+    ]
+    for service, result in snapshot['services'].items():
+        lines.append(f'service_probe_seconds{render_labels(service=service)} {result["latency_ms"] / 1000}')
+
+    if snapshot['celery_queue_length'] is not None:
+        lines += [
+            '# HELP celery_queue_length Tasks waiting in the Celery broker queue.',
+            '# TYPE celery_queue_length gauge',
+            f'celery_queue_length{render_labels(queue=snapshot["celery_queue"])} {snapshot["celery_queue_length"]}',
+        ]
+
+    # the pool belongs to the worker serving this scrape, the pid label keeps workers apart
+    if pool := database_pool_stats():
+        for name in ('size', 'idle', 'in_use', 'waiting', 'max_size'):
+            lines += [
+                f'# TYPE db_pool_{name} gauge',
+                f'db_pool_{name}{render_labels(pid=pool["pid"])} {pool[name]}',
+            ]
+        for name in ('requests', 'timeouts', 'connection_errors'):
+            lines += [
+                f'# TYPE db_pool_{name}_total counter',
+                f'db_pool_{name}_total{render_labels(pid=pool["pid"])} {pool[name]}',
+            ]
+    return '\n'.join(lines) + '\n'
+
+
+def metrics(request):
+    from root.health import monitor
+
+    return HttpResponse(render_metrics(monitor.current()), content_type='text/plain; version=0.0.4; charset=utf-8')
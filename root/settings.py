@@ -9,10 +9,14 @@ https://docs.djangoproject.com/en/6.0/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
+import multiprocessing
 import os
+import sys
 from datetime import timedelta
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -45,6 +49,8 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
+
 
     # My Apps
     'apps.apps.AppsConfig',
@@ -60,6 +66,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'root.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -93,14 +100,50 @@ AUTH_USER_MODEL = 'apps.User'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# every gunicorn worker and celery process has its own pool. A celery child runs one task at a
+# time and gets a pool of CELERY_DB_POOL_MAX_SIZE; the web workers split what the children and
+# beat leave of the connection budget. The cpu-based worker count (gunicorn.conf.py reads it from
+# here) is capped so each worker gets a connection, a budget that can't give one is an error
+CELERY_WORKER_CONCURRENCY = int(os.getenv('CELERY_WORKER_CONCURRENCY', multiprocessing.cpu_count()))
+CELERY_DB_POOL_MAX_SIZE = int(os.getenv('CELERY_DB_POOL_MAX_SIZE', 1))
+DB_MAX_CONNECTIONS = int(os.getenv('DB_MAX_CONNECTIONS', 80))
+CELERY_DB_CONNECTIONS = (CELERY_WORKER_CONCURRENCY + 1) * CELERY_DB_POOL_MAX_SIZE
+WEB_DB_CONNECTIONS = DB_MAX_CONNECTIONS - CELERY_DB_CONNECTIONS
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', max(1, min(multiprocessing.cpu_count() * 2 + 1,
+                                                              WEB_DB_CONNECTIONS))))
+if WEB_DB_CONNECTIONS < WEB_CONCURRENCY:
+    raise ImproperlyConfigured(
+        f"DB_MAX_CONNECTIONS={DB_MAX_CONNECTIONS} leaves {WEB_DB_CONNECTIONS} connections after "
+        f"{CELERY_DB_CONNECTIONS} for celery, too few for WEB_CONCURRENCY={WEB_CONCURRENCY}")
+# `celery -A root worker` or `python -m celery -A root worker`
+RUNNING_CELERY = (os.path.basename(sys.argv[0]) == 'celery'
+                  or sys.argv[0].endswith(os.path.join('celery', '__main__.py')))
+if RUNNING_CELERY:
+    DB_POOL_MAX_SIZE = CELERY_DB_POOL_MAX_SIZE
+else:
+    DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', WEB_DB_CONNECTIONS // WEB_CONCURRENCY))
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql_psycopg2",
+        "ENGINE": "django.db.backends.postgresql",
         "NAME": os.getenv('POSTGRES_NAME'),
         "USER": os.getenv('POSTGRES_USER'),
         "PASSWORD": os.getenv('POSTGRES_PASSWORD'),
         "HOST": os.getenv('POSTGRES_HOST'),
-        "PORT": os.getenv('POSTGRES_PORT')
+        "PORT": os.getenv('POSTGRES_PORT'),
+        # with a pool this makes psycopg ping each connection before handing it out and replace dead ones
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "pool": {
+                "name": "default",
+                "min_size": min(2, DB_POOL_MAX_SIZE),
+                "max_size": DB_POOL_MAX_SIZE,
+                # seconds a request waits for a free connection before failing
+                "timeout": float(os.getenv('DB_POOL_TIMEOUT', 10)),
+                "max_idle": 5 * 60,
+                "max_lifetime": 60 * 60,
+            },
+        },
     }
 }
 
@@ -149,6 +192,33 @@ REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}"
 
 CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = 'django-db'
+CELERY_BEAT_SCHEDULE = {
+    'flush-sms-outbox': {
+        'task': 'apps.tasks.flush_sms_outbox',
+        'schedule': timedelta(seconds=5),
+    },
+    'flush-carts': {
+        'task': 'apps.tasks.flush_carts',
+        'schedule': timedelta(seconds=5),
+    },
+    'update-sales-rollups': {
+        'task': 'apps.tasks.update_sales_rollups',
+        'schedule': timedelta(minutes=1),
+    },
+    'settle-balance-ledger': {
+        'task': 'apps.tasks.settle_balance_ledger',
+        'schedule': timedelta(seconds=10),
+    },
+}
+
+# seconds between background health probes, a snapshot older than the ttl reports an error
+HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', 5))
+HEALTH_CHECK_TTL = float(os.getenv('HEALTH_CHECK_TTL', HEALTH_CHECK_INTERVAL * 3))
+
+SMS_PROVIDER = os.getenv('SMS_PROVIDER', 'apps.sms.FakeSMSProvider')
+SMS_PROVIDER_URL = os.getenv('SMS_PROVIDER_URL')
+SMS_PROVIDER_TOKEN = os.getenv('SMS_PROVIDER_TOKEN')
+SMS_BATCH_SIZE = 100
 
 CSRF_TRUSTED_ORIGINS = os.getenv("CSRF_TRUSTED_ORIGINS", "").split(",")
 
@@ -182,15 +252,22 @@ REST_FRAMEWORK = {
     # 'DEFAULT_THROTTLE_RATES': {
     #     'anon': '3/day'
     # },
+    'DEFAULT_THROTTLE_RATES': {
+        'auth': '10/min',
+        'register': '5/min',
+        'user_exists': '20/min',
+        'cart': '120/min',
+    },
     'DEFAULT_AUTHENTICATION_CLASSES': (
         # 'rest_framework.authentication.BasicAuthentication',
         # 'rest_framework.authentication.TokenAuthentication',
         # 'rest_framework.authentication.SessionAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 15,
-    'NUM_PROXIES': 50
+    # nginx is the only proxy, the client ip is the last X-Forwarded-For entry it appends
+    'NUM_PROXIES': 1
 }
 
 SIMPLE_JWT = {
@@ -21,6 +21,7 @@ from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
 from root.health import health
+from root.metrics import metrics
 from root.settings import MEDIA_URL, MEDIA_ROOT, STATIC_URL, STATIC_ROOT
 
 urlpatterns = [
@@ -29,7 +30,8 @@ urlpatterns = [
                   path('', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
                   path("admin/", admin.site.urls),
                   path("api/v1/", include('apps.urls')),
-                  path('health/', health),
+                  path('health/', health, name='health'),
+                  path('metrics/', metrics, name='metrics'),
 
               ] + static(MEDIA_URL, document_root=MEDIA_ROOT) + static(STATIC_URL,
                                                                        document_root=STATIC_ROOT)